@@ -0,0 +1 @@
+"""Benchmarks for the Cupid bot's hot paths."""
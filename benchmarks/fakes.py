@@ -0,0 +1,391 @@
+"""Local stand-ins for the Cupid API, Tenor and Discord, for load tests.
+
+The fake Cupid app has the same interface as the wrapper's app, and keeps
+its data in memory. Every call waits for a configurable latency, and is
+counted against the command being run (see `CURRENT_COMMAND`). It is
+permissive: a new proposal between two users replaces any relationship
+they already have, rather than being rejected.
+"""
+from __future__ import annotations
+
+import asyncio
+import collections
+import contextvars
+import dataclasses
+import itertools
+import math
+import random
+from typing import Any, Optional
+
+from cupid import Gender, RelationshipKind
+
+import discord
+from discord.ext.commands.view import StringView
+
+from .synthetic import Graph as SyntheticGraph
+
+
+# The command being run in the current task, for attributing API calls.
+CURRENT_COMMAND: contextvars.ContextVar[str] = contextvars.ContextVar(
+    'CURRENT_COMMAND', default='(background)',
+)
+
+# Users are given IDs above this, so that they look like Discord IDs.
+ID_OFFSET = 10 ** 17
+
+PAGE_SIZE = 20
+
+# IDs for fake messages.
+_message_ids = itertools.count(1)
+
+
+@dataclasses.dataclass
+class Latency:
+    """How long fake API calls take, in seconds."""
+
+    mean: float = 0.05
+    jitter: float = 0.0
+
+    async def wait(self):
+        """Wait for one call's worth of latency."""
+        delay = self.mean + random.uniform(-self.jitter, self.jitter)
+        await asyncio.sleep(max(delay, 0))
+
+
+@dataclasses.dataclass(eq=False)
+class FakeUser:
+    """A Cupid user, with the relationship helpers the bot uses."""
+
+    app: FakeApp = dataclasses.field(repr=False)
+    id: int
+    name: str
+    discriminator: str = '0001'
+    avatar_url: str = 'https://cdn.discordapp.com/embed/avatars/0.png'
+    gender: Gender = Gender.NON_BINARY
+
+    @property
+    def relationships(self) -> list[FakeRelationship]:
+        """Get all of the user's relationships and proposals."""
+        return [
+            self.app.relationships[key] for key in self.app.adjacency[self.id]
+        ]
+
+    @property
+    def accepted_relationships(self) -> list[FakeRelationship]:
+        """Get the user's accepted relationships."""
+        return [rel for rel in self.relationships if rel.accepted]
+
+    @property
+    def incoming_proposals(self) -> list[FakeRelationship]:
+        """Get proposals made to the user."""
+        return [
+            rel for rel in self.relationships
+            if not rel.accepted and rel.other is self
+        ]
+
+    @property
+    def outgoing_proposals(self) -> list[FakeRelationship]:
+        """Get proposals made by the user."""
+        return [
+            rel for rel in self.relationships
+            if not rel.accepted and rel.initiator is self
+        ]
+
+    async def edit(self, **fields: Any):
+        """Update the user's details."""
+        await self.app.call('edit_user')
+        for key, value in fields.items():
+            setattr(self, key, value)
+
+    async def propose(self, other: FakeUser, kind: RelationshipKind):
+        """Propose a relationship to another user."""
+        await self.app.call('propose')
+        self.app.relate(self, other, kind, accepted=False)
+
+    async def relationship(self, other: FakeUser) -> FakeRelationship:
+        """Get the user's relationship with another user."""
+        await self.app.call('get_relationship')
+        return self.app.relationships[_pair(self.id, other.id)]
+
+    async def graph(self) -> FakeGraph:
+        """Get everyone related to the user."""
+        await self.app.call('user_graph')
+        seen = {self.id}
+        queue = collections.deque([self.id])
+        while queue:
+            for key in self.app.adjacency[queue.popleft()]:
+                for user_id in key:
+                    if user_id not in seen:
+                        seen.add(user_id)
+                        queue.append(user_id)
+        return self.app.snapshot(seen)
+
+
+@dataclasses.dataclass(eq=False)
+class FakeRelationship:
+    """A relationship or proposal between two users."""
+
+    app: FakeApp
+    initiator: FakeUser
+    other: FakeUser
+    kind: RelationshipKind
+    accepted: bool
+
+    async def accept(self):
+        """Accept the proposal."""
+        await self.app.call('accept')
+        self.accepted = True
+
+    async def delete(self):
+        """Cancel, reject or leave the relationship."""
+        await self.app.call('delete_relationship')
+        self.app.unrelate(self)
+
+
+@dataclasses.dataclass
+class FakeGraph:
+    """A set of users and the accepted relationships between them."""
+
+    users: dict[int, FakeUser]
+    relationships: list[FakeRelationship]
+
+
+class FakePaginator:
+    """A paginated search of users."""
+
+    def __init__(self, app: FakeApp, search: Optional[str]):
+        """Store the search."""
+        self.app = app
+        self.search = (search or '').casefold()
+        self.total_pages = 0
+
+    async def get_page(self, number: int) -> list[FakeUser]:
+        """Get a page of results, and update the page count."""
+        await self.app.call('list_users')
+        users = [
+            user for user in self.app.accounts.values()
+            if self.search in user.name.casefold()
+        ]
+        self.total_pages = math.ceil(len(users) / PAGE_SIZE)
+        return users[number * PAGE_SIZE:(number + 1) * PAGE_SIZE]
+
+
+def _pair(a: int, b: int) -> tuple[int, int]:
+    """Get a key for a pair of users."""
+    return (a, b) if a < b else (b, a)
+
+
+class FakeApp:
+    """An in-memory Cupid app with simulated latency."""
+
+    name = 'Load test'
+
+    def __init__(self, latency: Latency):
+        """Set up the empty app."""
+        self.latency = latency
+        self.accounts: dict[int, FakeUser] = {}
+        self.relationships: dict[tuple[int, int], FakeRelationship] = {}
+        self.adjacency: dict[int, set[tuple[int, int]]] = (
+            collections.defaultdict(set)
+        )
+        # Map of command name -> API call name -> number of calls.
+        self.calls: dict[str, collections.Counter[str]] = (
+            collections.defaultdict(collections.Counter)
+        )
+
+    @classmethod
+    def from_synthetic(
+            cls, data: SyntheticGraph, latency: Latency) -> FakeApp:
+        """Seed an app with a synthetic family graph."""
+        app = cls(latency)
+        genders = list(Gender)
+        for user in data.users.values():
+            app.add_user(FakeUser(
+                app, ID_OFFSET + user.id, user.name,
+                gender=genders[user.id % len(genders)],
+            ))
+        for rel in data.relationships:
+            app.relate(
+                app.accounts[ID_OFFSET + rel.initiator.id],
+                app.accounts[ID_OFFSET + rel.other.id],
+                rel.kind,
+                accepted=rel.accepted,
+            )
+        return app
+
+    async def call(self, name: str):
+        """Simulate the latency of an API call, and count it."""
+        self.calls[CURRENT_COMMAND.get()][name] += 1
+        await self.latency.wait()
+
+    def add_user(self, user: FakeUser):
+        """Add a user without simulating a call."""
+        self.accounts[user.id] = user
+
+    def relate(
+            self,
+            initiator: FakeUser,
+            other: FakeUser,
+            kind: RelationshipKind,
+            accepted: bool) -> FakeRelationship:
+        """Add or replace the relationship between two users."""
+        key = _pair(initiator.id, other.id)
+        relationship = FakeRelationship(self, initiator, other, kind, accepted)
+        self.relationships[key] = relationship
+        self.adjacency[initiator.id].add(key)
+        self.adjacency[other.id].add(key)
+        return relationship
+
+    def unrelate(self, relationship: FakeRelationship):
+        """Remove a relationship."""
+        key = _pair(relationship.initiator.id, relationship.other.id)
+        self.relationships.pop(key, None)
+        for user_id in key:
+            self.adjacency[user_id].discard(key)
+
+    def snapshot(self, user_ids: set[int]) -> FakeGraph:
+        """Get the graph of some users."""
+        return FakeGraph(
+            users={user_id: self.accounts[user_id] for user_id in user_ids},
+            relationships=[
+                rel for key, rel in self.relationships.items()
+                if rel.accepted and key[0] in user_ids
+            ],
+        )
+
+    async def get_user(self, id: int) -> FakeUser:
+        """Get a user by ID.
+
+        All users are seeded up front, so an unknown ID is a bug in the
+        load test rather than something to simulate.
+        """
+        await self.call('get_user')
+        return self.accounts[id]
+
+    async def create_user(self, id: int, **fields: Any) -> FakeUser:
+        """Register a user."""
+        await self.call('create_user')
+        user = FakeUser(self, id, **fields)
+        self.add_user(user)
+        return user
+
+    def users(self, search: Optional[str] = None) -> FakePaginator:
+        """Search for users."""
+        return FakePaginator(self, search)
+
+    async def graph(self) -> FakeGraph:
+        """Get the entire graph."""
+        await self.call('graph')
+        return self.snapshot(set(self.accounts))
+
+
+class FakeCupid:
+    """A stand-in for the wrapper's client, which only knows one app."""
+
+    def __init__(self, app: FakeApp):
+        """Store the app."""
+        self._app = app
+
+    async def app(self, token: str) -> FakeApp:
+        """Authenticate as the app."""
+        await self._app.call('authenticate')
+        return self._app
+
+    async def close(self):
+        """Do nothing, since there is no connection to close."""
+
+
+class FakeGifPool:
+    """A stand-in for the bot's GIF pool which doesn't call Tenor."""
+
+    URL = 'https://media.tenor.com/load-test.gif'
+
+    def __init__(self, latency: Latency):
+        """Store the simulated latency."""
+        self.latency = latency
+
+    def pop(self, search: str) -> str:
+        """Get a GIF without waiting."""
+        return self.URL
+
+    async def get(self, search: str) -> str:
+        """Get a GIF after the simulated latency."""
+        await self.latency.wait()
+        return self.URL
+
+    def refill(self, search: str):
+        """Do nothing, since GIFs are never used up."""
+
+
+class FakeAvatar:
+    """A Discord avatar."""
+
+    def __init__(self, url: str):
+        """Store the URL."""
+        self.url = url
+
+
+class FakeMember:
+    """The parts of a Discord member which the bot uses.
+
+    It claims to be a `discord.Member`, since the member converter checks.
+    """
+
+    __class__ = property(lambda self: discord.Member)
+
+    def __init__(self, user: FakeUser):
+        """Copy the details of the matching Cupid user."""
+        self.id = user.id
+        self.name = user.name
+        self.discriminator = user.discriminator
+        self.avatar = FakeAvatar(user.avatar_url)
+        self.avatar_url = user.avatar_url
+        self.bot = False
+        self.display_name = user.name
+        self.mention = f'<@{user.id}>'
+
+    def __str__(self) -> str:
+        """Get the member's name and discriminator."""
+        return f'{self.name}#{self.discriminator}'
+
+
+class FakeGuild:
+    """A Discord guild whose members are the fake Cupid app's users."""
+
+    def __init__(self, id: int, members: dict[int, FakeMember]):
+        """Store the members."""
+        self.id = id
+        self.members = members
+
+    def get_member(self, user_id: int) -> Optional[FakeMember]:
+        """Get a member by ID."""
+        return self.members.get(user_id)
+
+
+class FakeMessage:
+    """A Discord message, sent by a command or to invoke one."""
+
+    def __init__(
+            self,
+            content: str = '',
+            author: Optional[FakeMember] = None,
+            guild: Optional[FakeGuild] = None):
+        """Store the message's details."""
+        self.id = next(_message_ids)
+        self.content = content
+        self.author = author
+        self.guild = guild
+        self.channel = None
+        self.mentions: list[FakeMember] = []
+        self.attachments: list = []
+        self._state = None
+
+    async def edit(self, **fields: Any):
+        """Pretend to edit the message."""
+
+
+def command_view(content: str, prefix: str) -> tuple[StringView, str]:
+    """Parse a message into a view of its arguments and the invoked name."""
+    view = StringView(content)
+    view.skip_string(prefix)
+    return view, view.get_word()
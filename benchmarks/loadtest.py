@@ -0,0 +1,205 @@
+"""Measure command throughput and latency against a fake Cupid API.
+
+The real bot and cogs are used, but Discord, Cupid and Tenor are replaced
+with local stand-ins. Each worker plays a pair of users, and repeatedly
+runs the chosen commands in order.
+
+Run with `poe bench-load` (tree rendering requires Graphviz).
+"""
+import argparse
+import asyncio
+import collections
+import importlib
+import statistics
+import time
+from typing import Optional
+
+from . import fakes
+from .synthetic import families
+
+
+bot_module = importlib.import_module('cupid-bot.bot')
+config = importlib.import_module('cupid-bot.config')
+utils = importlib.import_module('cupid-bot.utils')
+
+# Commands to run, as which of the worker's users runs them and a template
+# filled in with both users' mentions and the tree options.
+SCRIPTS = {
+    'profile': ('a', 'profile {b}'),
+    'list': ('a', 'list user 1'),
+    'tree': ('a', 'tree {a} {tree}'),
+    'propose': ('a', 'propose {b}'),
+    'accept': ('b', 'accept {a}'),
+}
+
+
+class SyntheticContext(utils.Context):
+    """A command context whose replies are discarded."""
+
+    async def send(
+            self,
+            content: Optional[str] = None,
+            **kwargs: object) -> fakes.FakeMessage:
+        """Pretend to send a message."""
+        return fakes.FakeMessage(content or '', guild=self.guild)
+
+
+async def invoke(
+        bot: 'bot_module.CupidBot',
+        author: fakes.FakeMember,
+        guild: fakes.FakeGuild,
+        content: str) -> tuple[str, float, bool]:
+    """Run a command, returning its name, duration and if it failed."""
+    prefix = config.CONFIG.prefix
+    message = fakes.FakeMessage(prefix + content, author, guild)
+    view, invoked_with = fakes.command_view(message.content, prefix)
+    ctx = SyntheticContext(
+        prefix=prefix,
+        view=view,
+        bot=bot,
+        message=message,
+        invoked_with=invoked_with,
+        command=bot.all_commands.get(invoked_with),
+    )
+    token = fakes.CURRENT_COMMAND.set(invoked_with)
+    start = time.perf_counter()
+    try:
+        await bot.invoke(ctx)
+    finally:
+        fakes.CURRENT_COMMAND.reset(token)
+    return invoked_with, time.perf_counter() - start, ctx.command_failed
+
+
+async def worker(
+        bot: 'bot_module.CupidBot',
+        guild: fakes.FakeGuild,
+        a: fakes.FakeMember,
+        b: fakes.FakeMember,
+        args: argparse.Namespace,
+        results: list[tuple[str, float, bool]]):
+    """Run the chosen commands repeatedly as a pair of users."""
+    members = {'a': a, 'b': b}
+    for _ in range(args.rounds):
+        for name in args.commands:
+            author, template = SCRIPTS[name]
+            content = template.format(
+                a=a.mention, b=b.mention, tree=args.tree,
+            )
+            results.append(await invoke(
+                bot, members[author], guild, content.strip(),
+            ))
+
+
+def percentile(values: list[float], quantile: float) -> float:
+    """Get a percentile of some values, in milliseconds."""
+    if len(values) < 2:
+        return values[0] * 1000
+    cuts = statistics.quantiles(values, n=100)
+    return cuts[round(quantile * 100) - 1] * 1000
+
+
+def report(
+        results: list[tuple[str, float, bool]],
+        seconds: float,
+        app: fakes.FakeApp):
+    """Print throughput, latency percentiles and API calls per command."""
+    durations: dict[str, list[float]] = collections.defaultdict(list)
+    failures: collections.Counter[str] = collections.Counter()
+    for name, duration, failed in results:
+        durations[name].append(duration)
+        failures[name] += failed
+    print(
+        f'{len(results)} commands in {seconds:.2f}s '
+        f'({len(results) / seconds:.1f} commands/s).\n',
+    )
+    print(
+        f'{"command":>10} {"count":>6} {"failed":>6} {"p50 ms":>8} '
+        f'{"p95 ms":>8} {"p99 ms":>8} {"API calls":>10}',
+    )
+    for name, values in durations.items():
+        calls = sum(app.calls[name].values()) / len(values)
+        print(
+            f'{name:>10} {len(values):>6} {failures[name]:>6} '
+            f'{percentile(values, 0.5):>8.1f} '
+            f'{percentile(values, 0.95):>8.1f} '
+            f'{percentile(values, 0.99):>8.1f} {calls:>10.2f}',
+        )
+    print('\nAPI calls by command:')
+    for name, calls in sorted(app.calls.items()):
+        summary = ', '.join(f'{call}={n}' for call, n in calls.most_common())
+        print(f'  {name}: {summary}')
+
+
+async def run(args: argparse.Namespace):
+    """Set up the bot with fake services and run the workers."""
+    latency = fakes.Latency(args.latency, args.jitter)
+    app = fakes.FakeApp.from_synthetic(families(args.users), latency)
+    users = list(app.accounts.values())
+    if len(users) < args.concurrency * 2:
+        raise SystemExit('Need at least two users per worker.')
+    guild = fakes.FakeGuild(
+        config.CONFIG.guild_id,
+        {user.id: fakes.FakeMember(user) for user in users},
+    )
+    bot = bot_module.CupidBot()
+    bot.cupid = fakes.FakeCupid(app)
+    bot.gifs = fakes.FakeGifPool(latency)
+    bot.profile_sync.start()
+    state = bot.guild_states[guild.id]
+    if args.cold:
+        state.app = app
+        state.warmed_up.set()
+    else:
+        await state.warm_up()
+    results: list[tuple[str, float, bool]] = []
+    start = time.perf_counter()
+    try:
+        await asyncio.gather(*(
+            worker(
+                bot, guild,
+                guild.members[users[index * 2].id],
+                guild.members[users[index * 2 + 1].id],
+                args, results,
+            )
+            for index in range(args.concurrency)
+        ))
+    finally:
+        seconds = time.perf_counter() - start
+        state.close()
+        await bot.profile_sync.close()
+        bot.renderer.close()
+    report(results, seconds, app)
+
+
+def main():
+    """Run the load test."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--concurrency', type=int, default=10)
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--users', type=int, default=1_000)
+    parser.add_argument(
+        '--latency', type=float, default=0.05,
+        help='Mean seconds per fake API call.',
+    )
+    parser.add_argument('--jitter', type=float, default=0.01)
+    parser.add_argument(
+        '--commands', nargs='+', choices=list(SCRIPTS), default=list(SCRIPTS),
+    )
+    parser.add_argument(
+        '--tree', default='depth=2', help='Options for the tree command.',
+    )
+    parser.add_argument(
+        '--cold', action='store_true',
+        help='Skip the warm-up, so the local indexes start empty.',
+    )
+    args = parser.parse_args()
+    config.load(
+        cupid_token='load-test',
+        discord_token='load-test',
+        tenor_token='load-test',
+    )
+    asyncio.run(run(args))
+
+
+if __name__ == '__main__':
+    main()
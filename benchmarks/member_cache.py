@@ -0,0 +1,102 @@
+"""Compare memory used by the full member cache and the light mode's LRU.
+
+Real discord.py member objects are built from synthetic gateway payloads.
+In full mode every member is kept, as the guild's member cache does. In
+light mode every member passes through an LRU of `member_cache_size`, the
+worst case for a busy guild.
+
+Run with `poe bench-members`.
+"""
+import argparse
+import importlib
+import secrets
+import tracemalloc
+import weakref
+from typing import Any, Callable
+
+import discord
+
+
+cache_utils = importlib.import_module('cupid-bot.utils.cache')
+
+
+class PayloadState:
+    """The parts of discord.py's connection state that members need.
+
+    Users are stored weakly, as in discord.py, so they are only kept alive
+    by the members referencing them.
+    """
+
+    def __init__(self):
+        """Set up the user store."""
+        self.users: weakref.WeakValueDictionary[int, discord.User] = (
+            weakref.WeakValueDictionary()
+        )
+
+    def store_user(self, data: dict[str, Any]) -> discord.User:
+        """Create a user from a payload."""
+        user = discord.User(state=self, data=data)
+        self.users[user.id] = user
+        return user
+
+
+def member_payload(number: int) -> dict[str, Any]:
+    """Get a gateway payload for a guild member."""
+    return {
+        'user': {
+            'id': str(10 ** 17 + number),
+            'username': f'Member {number}',
+            'discriminator': f'{number % 10_000:04}',
+            'avatar': secrets.token_hex(16),
+        },
+        'roles': [str(10 ** 17 + role) for role in range(number % 3)],
+        'joined_at': '2021-08-01T12:00:00.000000+00:00',
+        'nick': f'Nick {number}' if number % 4 == 0 else None,
+    }
+
+
+def measure(count: int, keep: Callable[[discord.Member], None]) -> int:
+    """Get the bytes still allocated after creating and keeping members."""
+    state = PayloadState()
+    tracemalloc.start()
+    for number in range(count):
+        keep(discord.Member(
+            data=member_payload(number), guild=None, state=state,
+        ))
+    allocated, _peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return allocated
+
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        '--members', type=int, nargs='+', default=[10_000, 100_000],
+    )
+    parser.add_argument('--cache-size', type=int, default=1_000)
+    args = parser.parse_args()
+    print(
+        f'{"members":>8} {"full MiB":>10} {"light MiB":>10} '
+        f'{"saved MiB":>10} {"bytes/member":>13}',
+    )
+    for count in args.members:
+        full: dict[int, discord.Member] = {}
+        full_bytes = measure(
+            count, lambda member: full.__setitem__(member.id, member),
+        )
+        light = cache_utils.LRUCache(args.cache_size)
+        light_bytes = measure(
+            count, lambda member: light.set(member.id, member),
+        )
+        print(
+            f'{count:>8} {full_bytes / 2**20:>10.1f} '
+            f'{light_bytes / 2**20:>10.1f} '
+            f'{(full_bytes - light_bytes) / 2**20:>10.1f} '
+            f'{full_bytes / count:>13.0f}',
+        )
+        full.clear()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""Compare dot layout time with per-edge and merged rank constraints.
+
+Run with `poe bench-ranks` (requires Graphviz to be installed).
+"""
+import argparse
+import collections
+import importlib
+import subprocess
+import time
+from typing import Callable, Optional
+
+from cupid import RelationshipKind
+
+import graphviz
+
+from .synthetic import Graph, Relationship, User, families
+
+
+graph_utils = importlib.import_module('cupid-bot.utils.graph')
+
+PlotEdges = Callable[[graphviz.Graph, list[Relationship]], None]
+
+
+def legacy_plot_edges(
+        graph: graphviz.Graph, relationships: list[Relationship]):
+    """Plot edges with a rank constraint per marriage and set of siblings.
+
+    This is how edges were plotted before rank groups were merged.
+    """
+    siblings: dict[int, list[User]] = collections.defaultdict(list)
+    for relationship in relationships:
+        graph.edge(str(relationship.initiator.id), str(relationship.other.id))
+        if relationship.kind == RelationshipKind.MARRIAGE:
+            graph_utils.force_same_rank(
+                graph, relationship.initiator.id, relationship.other.id,
+            )
+        else:
+            siblings[relationship.initiator.id].append(relationship.other)
+    for children in siblings.values():
+        graph_utils.force_same_rank(graph, *(child.id for child in children))
+
+
+def build(data: Graph, plot_edges: PlotEdges) -> graphviz.Graph:
+    """Build the Graphviz source for a graph."""
+    graph = graphviz.Graph(graph_attr={'splines': 'ortho'})
+    graph_utils.plot_nodes(graph, data.users)
+    plot_edges(graph, data.relationships)
+    return graph
+
+
+def time_layout(graph: graphviz.Graph, timeout: float) -> Optional[float]:
+    """Time how long dot takes to lay out a graph, or None on timeout."""
+    start = time.perf_counter()
+    try:
+        subprocess.run(
+            [graph.engine, '-Tplain'],
+            input=graph.source.encode('utf-8'),
+            capture_output=True,
+            timeout=timeout,
+            check=True,
+        )
+    except subprocess.TimeoutExpired:
+        return None
+    return time.perf_counter() - start
+
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        '--sizes', type=int, nargs='+', default=[1_000, 10_000],
+    )
+    parser.add_argument('--timeout', type=float, default=600)
+    args = parser.parse_args()
+    variants = {
+        'per-edge': legacy_plot_edges,
+        'merged': graph_utils.plot_edges,
+    }
+    print(f'{"nodes":>8} {"variant":>10} {"subgraphs":>10} {"dot (s)":>10}')
+    for size in args.sizes:
+        data = families(size)
+        for name, plot_edges in variants.items():
+            graph = build(data, plot_edges)
+            subgraphs = graph.source.count('rank=same')
+            seconds = time_layout(graph, args.timeout)
+            result = f'{seconds:.2f}' if seconds is not None else 'timeout'
+            print(f'{size:>8} {name:>10} {subgraphs:>10} {result:>10}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,177 @@
+"""Time each stage of drawing family trees of different shapes and sizes.
+
+DOT source construction, `dot` layout and PNG encoding are timed
+separately: the laid out graph is saved in DOT format, then encoded with
+`neato -n2`, which keeps the existing layout. Results are written as JSON,
+so runs can be compared across versions.
+
+Run with `poe bench-render` (requires Graphviz to be installed).
+"""
+import argparse
+import importlib
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from typing import Any, Optional
+
+import graphviz
+
+from .synthetic import Graph, TOPOLOGIES
+
+
+graph_utils = importlib.import_module('cupid-bot.utils.graph')
+
+
+def run_stage(
+        command: list[str],
+        source: bytes,
+        timeout: float) -> tuple[Optional[float], Optional[bytes]]:
+    """Time a Graphviz command, returning None for both on timeout."""
+    start = time.perf_counter()
+    try:
+        result = subprocess.run(
+            command,
+            input=source,
+            capture_output=True,
+            timeout=timeout,
+            check=True,
+        )
+    except subprocess.TimeoutExpired:
+        return None, None
+    return time.perf_counter() - start, result.stdout
+
+
+def time_build(data: Graph, repeat: int) -> dict[str, Any]:
+    """Time building the DOT source, taking the median of some runs."""
+    nodes, edges, total = [], [], []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        graph = graph_utils.build_graph(data)
+        source = graph.source
+        total.append(time.perf_counter() - start)
+        partial = graphviz.Graph()
+        start = time.perf_counter()
+        graph_utils.plot_nodes(partial, data.users)
+        nodes.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        graph_utils.plot_edges(partial, data.relationships)
+        edges.append(time.perf_counter() - start)
+    return {
+        'source': source.encode('utf-8'),
+        'engine': graph.engine,
+        'plot_nodes_seconds': statistics.median(nodes),
+        'plot_edges_seconds': statistics.median(edges),
+        'build_seconds': statistics.median(total),
+    }
+
+
+def bench(
+        topology: str,
+        size: int,
+        repeat: int,
+        timeout: float) -> dict[str, Any]:
+    """Build, lay out and encode one synthetic graph."""
+    data = TOPOLOGIES[topology](size)
+    build = time_build(data, repeat)
+    source = build.pop('source')
+    engine = build.pop('engine')
+    layout_seconds, layout = run_stage([engine, '-Tdot'], source, timeout)
+    encode_seconds, image = None, None
+    if layout is not None:
+        encode_seconds, image = run_stage(
+            ['neato', '-n2', '-Tpng'], layout, timeout,
+        )
+    return {
+        'topology': topology,
+        'size': size,
+        'nodes': len(data.users),
+        'edges': len(data.relationships),
+        'rank_groups': len(graph_utils.rank_groups(data.relationships)),
+        **build,
+        'source_bytes': len(source),
+        'layout_seconds': layout_seconds,
+        'layout_bytes': len(layout) if layout is not None else None,
+        'encode_seconds': encode_seconds,
+        'png_bytes': len(image) if image is not None else None,
+    }
+
+
+def environment() -> dict[str, Any]:
+    """Describe what the benchmark was run on."""
+    try:
+        revision = subprocess.run(
+            ['git', 'rev-parse', 'HEAD'],
+            capture_output=True, check=True, text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        revision = None
+    graphviz_version = subprocess.run(
+        ['dot', '-V'], capture_output=True, text=True,
+    ).stderr.strip()
+    return {
+        'revision': revision,
+        'graphviz': graphviz_version,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+    }
+
+
+def format_seconds(seconds: Optional[float]) -> str:
+    """Format a duration for the progress table."""
+    return f'{seconds:.3f}' if seconds is not None else 'timeout'
+
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        '--topologies', nargs='+', choices=list(TOPOLOGIES),
+        default=list(TOPOLOGIES),
+    )
+    parser.add_argument(
+        '--sizes', type=int, nargs='+', default=[100, 1_000, 10_000, 50_000],
+    )
+    parser.add_argument(
+        '--repeat', type=int, default=3,
+        help='Times to build the source, taking the median.',
+    )
+    parser.add_argument(
+        '--timeout', type=float, default=300,
+        help='Seconds before layout or encoding is abandoned.',
+    )
+    parser.add_argument(
+        '--output', type=argparse.FileType('w'), default=sys.stdout,
+        help='File to write the JSON results to.',
+    )
+    args = parser.parse_args()
+    results = []
+    print(
+        f'{"topology":>10} {"nodes":>6} {"build (s)":>10} '
+        f'{"layout (s)":>10} {"encode (s)":>10} {"png bytes":>10}',
+        file=sys.stderr,
+    )
+    for topology in args.topologies:
+        for size in args.sizes:
+            result = bench(topology, size, args.repeat, args.timeout)
+            results.append(result)
+            print(
+                f'{topology:>10} {result["nodes"]:>6} '
+                f'{result["build_seconds"]:>10.3f} '
+                f'{format_seconds(result["layout_seconds"]):>10} '
+                f'{format_seconds(result["encode_seconds"]):>10} '
+                f'{result["png_bytes"] or "-":>10}',
+                file=sys.stderr,
+            )
+    json.dump(
+        {'environment': environment(), 'results': results},
+        args.output,
+        indent=2,
+    )
+    args.output.write('\n')
+
+
+if __name__ == '__main__':
+    main()
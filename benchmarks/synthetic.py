@@ -0,0 +1,165 @@
+"""Synthetic family graphs for benchmarks.
+
+These mimic the shape of the API's graph models closely enough to be drawn
+by the bot's graph utilities, without needing the API.
+"""
+from __future__ import annotations
+
+import dataclasses
+import random
+
+from cupid import RelationshipKind
+
+
+@dataclasses.dataclass(frozen=True)
+class User:
+    """A stand-in for a Cupid user."""
+
+    id: int
+    name: str
+
+
+@dataclasses.dataclass(frozen=True)
+class Relationship:
+    """A stand-in for a Cupid relationship."""
+
+    initiator: User
+    other: User
+    kind: RelationshipKind
+    accepted: bool = True
+
+
+@dataclasses.dataclass
+class Graph:
+    """A stand-in for a Cupid graph."""
+
+    users: dict[int, User] = dataclasses.field(default_factory=dict)
+    relationships: list[Relationship] = dataclasses.field(
+        default_factory=list,
+    )
+
+    def add_user(self) -> User:
+        """Add a new user to the graph."""
+        user_id = len(self.users) + 1
+        user = User(id=user_id, name=f'User {user_id}')
+        self.users[user_id] = user
+        return user
+
+    def marry(self, a: User, b: User):
+        """Add a marriage between two users."""
+        self.relationships.append(
+            Relationship(a, b, RelationshipKind.MARRIAGE),
+        )
+
+    def adopt(self, parent: User, child: User):
+        """Add an adoption of one user by another."""
+        self.relationships.append(
+            Relationship(parent, child, RelationshipKind.ADOPTION),
+        )
+
+
+def families(size: int, seed: int = 0) -> Graph:
+    """Generate generations of families which marry into each other.
+
+    Each couple adopts a few children, and the children of each generation
+    marry across families. Some people marry twice, joining multiple sets
+    of siblings together.
+    """
+    rng = random.Random(seed)
+    graph = Graph()
+    couples = []
+    while len(graph.users) < size and len(couples) < max(size // 20, 1):
+        a, b = graph.add_user(), graph.add_user()
+        graph.marry(a, b)
+        couples.append((a, b))
+    while len(graph.users) < size:
+        children = []
+        for parents in couples:
+            for _ in range(rng.randint(1, 4)):
+                if len(graph.users) >= size:
+                    break
+                child = graph.add_user()
+                for parent in parents:
+                    graph.adopt(parent, child)
+                children.append(child)
+        rng.shuffle(children)
+        couples = list(zip(children[::2], children[1::2]))
+        for a, b in couples:
+            graph.marry(a, b)
+        for a, _b in rng.sample(couples, len(couples) // 10):
+            c, _d = rng.choice(couples)
+            if c != a:
+                graph.marry(a, c)
+        if not couples:
+            break
+    return graph
+
+
+def chain(size: int) -> Graph:
+    """Generate one long line of descent, each person adopting the next."""
+    graph = Graph()
+    parent = graph.add_user()
+    while len(graph.users) < size:
+        child = graph.add_user()
+        graph.adopt(parent, child)
+        parent = child
+    return graph
+
+
+def siblings(size: int) -> Graph:
+    """Generate one couple who have adopted everyone else."""
+    graph = Graph()
+    a, b = graph.add_user(), graph.add_user()
+    graph.marry(a, b)
+    while len(graph.users) < size:
+        child = graph.add_user()
+        graph.adopt(a, child)
+        graph.adopt(b, child)
+    return graph
+
+
+def polygamous(size: int, cluster_size: int = 8) -> Graph:
+    """Generate clusters of people all married to one person.
+
+    Each cluster shares a spouse with the one before it, so the clusters
+    form one long chain of marriages.
+    """
+    graph = Graph()
+    shared = None
+    while len(graph.users) < size:
+        hub = graph.add_user()
+        spouses = [shared] if shared else []
+        while len(spouses) < cluster_size - 1 and len(graph.users) < size:
+            spouses.append(graph.add_user())
+        for spouse in spouses:
+            graph.marry(hub, spouse)
+        shared = spouses[-1] if spouses else None
+    return graph
+
+
+def forest(size: int, seed: int = 0) -> Graph:
+    """Generate many small, unrelated families."""
+    rng = random.Random(seed)
+    graph = Graph()
+    while len(graph.users) < size:
+        a = graph.add_user()
+        if len(graph.users) >= size:
+            break
+        b = graph.add_user()
+        graph.marry(a, b)
+        for _ in range(rng.randint(0, 4)):
+            if len(graph.users) >= size:
+                break
+            child = graph.add_user()
+            graph.adopt(a, child)
+            graph.adopt(b, child)
+    return graph
+
+
+TOPOLOGIES = {
+    'families': families,
+    'chain': chain,
+    'siblings': siblings,
+    'polygamous': polygamous,
+    'forest': forest,
+}
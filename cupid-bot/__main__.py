@@ -7,4 +7,5 @@ from . import bot, config
 if __name__ == '__main__':
     logging.basicConfig(level=logging.INFO)
     config.load()
-    bot.CupidBot()
+    bot_class = bot.ShardedCupidBot if config.CONFIG.sharded else bot.CupidBot
+    bot_class().run(config.CONFIG.discord_token)
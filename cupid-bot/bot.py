@@ -1,114 +1,342 @@
 """Subclass of the Discord.py ext.commands bot for the Cupid bot."""
+import asyncio
+import logging
+import time
 import typing
 
-from cupid import Cupid, Gender, NotFoundError
+from cupid import Cupid
 from cupid.annotations import UserAsAppWithRelationships
 
 import discord
 from discord.ext import commands
 
 from .config import CONFIG
-from .utils import errors
+from .guilds import GuildState
+from .utils import errors, slash
+from .utils.cache import LRUCache, SingleFlight
+from .utils.gifs import GifPool, PROPOSAL_TERMS
+from .utils.graph import GraphRenderer
 from .utils.helpcmd import Help
+from .utils.http import HttpClient
+from .utils.metrics import COMMAND_SECONDS, REGISTRY
+from .utils.pagination import live_paginators
+from .utils.resilience import CircuitBreaker, ResilientCaller
+from .utils.sync import ProfileSyncQueue
+from .utils.treecache import TreeCache
+from .utils.warmup import StillWarmingUp
 
 if typing.TYPE_CHECKING:
     from .utils import Context
 
 
+logger = logging.getLogger(__name__)
+
 DESCRIPTION = (
     'Cupid Bot is responsible for managing all your marriage and adoption '
     'needs.'
 )
 
+# Keys of the shared caches: a guild ID and a user ID.
+GuildKey = tuple[int, int]
+
+
+def get_prefix(bot: 'CupidBot', message: discord.Message) -> str:
+    """Get the command prefix for the guild a message was sent in."""
+    state = bot.guild_state(message.guild)
+    return state.config.prefix if state else CONFIG.prefix
+
 
 class CupidBot(commands.Bot):
     """Bot class for the Cupid bot."""
 
-    def __init__(self):
+    def __init__(self, **options: typing.Any):
         """Set up the bot."""
         intents = discord.Intents.none()
         intents.messages = True
         intents.guilds = True
         intents.members = True
         intents.guild_reactions = True
+        member_cache: dict[str, typing.Any] = {}
+        if CONFIG.member_cache_light:
+            # Members are fetched when needed, and kept in self.member_cache.
+            member_cache = {
+                'member_cache_flags': discord.MemberCacheFlags.none(),
+                'chunk_guilds_at_startup': False,
+            }
         super().__init__(
-            CONFIG.prefix,
+            get_prefix,
             help_command=Help(),
             description=DESCRIPTION,
             intents=discord.Intents(
-                messages=True,
+                # Only needed for prefix commands.
+                messages=CONFIG.prefix_commands,
                 guild_reactions=True,
                 guilds=True,
                 members=True,
             ),
+            **member_cache,
+            **options,
         )
         self.cupid = Cupid(CONFIG.cupid_api_url)
+        self.api = ResilientCaller(
+            timeout=CONFIG.api_timeout,
+            retries=CONFIG.api_retries,
+            backoff=CONFIG.api_backoff,
+            breaker=CircuitBreaker(
+                threshold=CONFIG.api_breaker_threshold,
+                reset_after=CONFIG.api_breaker_reset,
+            ),
+        )
+        # Shared between guilds, and keyed by guild ID and user ID.
+        self.user_cache: LRUCache[GuildKey, UserAsAppWithRelationships] = (
+            LRUCache(CONFIG.user_cache_size, CONFIG.user_cache_ttl)
+        )
+        self.member_cache: LRUCache[GuildKey, discord.Member] = LRUCache(
+            CONFIG.member_cache_size, CONFIG.member_cache_ttl,
+        )
+        # Concurrent fetches of the same user share one API call.
+        self.user_fetches: SingleFlight[
+            GuildKey, UserAsAppWithRelationships,
+        ] = SingleFlight()
+        self.profile_sync = ProfileSyncQueue(
+            self.sync_profile,
+            concurrency=CONFIG.profile_sync_concurrency,
+            batch_size=CONFIG.profile_sync_batch_size,
+        )
+        self.renderer = GraphRenderer(
+            workers=CONFIG.render_workers,
+            timeout=CONFIG.render_timeout,
+            max_queue=CONFIG.render_queue_size,
+        )
+        self.tree_cache = TreeCache(
+            max_bytes=CONFIG.tree_cache_bytes,
+            scope_ttl=CONFIG.tree_cache_ttl,
+            directory=CONFIG.tree_cache_dir,
+        )
+        self.web = HttpClient(
+            pool_size=CONFIG.http_pool_size,
+            keepalive=CONFIG.http_keepalive,
+            dns_ttl=CONFIG.http_dns_ttl,
+            connect_timeout=CONFIG.http_connect_timeout,
+            read_timeout=CONFIG.http_read_timeout,
+        )
+        self.gifs = GifPool(
+            self.web, low=CONFIG.gif_pool_low, high=CONFIG.gif_pool_high,
+        )
+        self.guild_states = {
+            guild_id: GuildState(self, guild_config)
+            for guild_id, guild_config in CONFIG.guilds.items()
+        }
+        self.metrics_server: typing.Optional[asyncio.AbstractServer] = None
+        self.register_gauges()
         self.add_check(self.global_check)
         try:
             self.load_extension('jishaku')
         except commands.ExtensionNotFound:
             pass
         self.load_extension('cupid-bot.cogs')
-        self.run(CONFIG.discord_token)
 
     async def on_ready(self):
-        """Create the Cupid App instance."""
-        self.app = await self.cupid.app(CONFIG.cupid_token)
+        """Start serving the configured guilds on this bot's shards."""
         print(f'Discord: Logged in as {self.user}.')
-        print(f'Cupid API: Logged in as {self.app.name}.')
-        print('----------')
+        for guild in self.guilds:
+            self.start_guild(guild)
+
+    async def on_guild_join(self, guild: discord.Guild):
+        """Start serving a guild the bot has been added to."""
+        self.start_guild(guild)
+
+    def start_guild(self, guild: discord.Guild):
+        """Warm up a configured guild and register its commands, once."""
+        state = self.guild_states.get(guild.id)
+        if state and not state.warmup_task:
+            state.start()
+            asyncio.create_task(self.sync_application_commands(guild.id))
+
+    def guild_state(
+            self,
+            guild: typing.Optional[discord.Guild],
+    ) -> typing.Optional[GuildState]:
+        """Get the state for a guild, if it is configured."""
+        return self.guild_states.get(guild.id) if guild else None
+
+    async def sync_application_commands(self, guild_id: int):
+        """Register the application commands, logging any errors."""
+        try:
+            await slash.sync_commands(self, guild_id)
+        except discord.HTTPException:
+            logger.exception('Failed to register application commands.')
+
+    async def on_interaction(self, interaction: discord.Interaction):
+        """Run application commands."""
+        if interaction.type == discord.InteractionType.application_command:
+            await slash.invoke(self, interaction)
+
+    async def start(self, *args: typing.Any, **kwargs: typing.Any):
+        """Start background workers, then connect to Discord."""
+        self.web.open()
+        self.profile_sync.start()
+        for search in PROPOSAL_TERMS.values():
+            self.gifs.refill(search)
+        if CONFIG.metrics_port is not None:
+            self.metrics_server = await REGISTRY.serve(
+                CONFIG.metrics_host, CONFIG.metrics_port,
+            )
+        await super().start(*args, **kwargs)
 
     async def close(self):
-        """Close the Discord and Cupid clients."""
+        """Flush pending work and close the Discord and HTTP clients."""
+        await self.profile_sync.close()
+        self.renderer.close()
+        for state in self.guild_states.values():
+            state.close()
+        if self.metrics_server:
+            self.metrics_server.close()
+        await self.web.close()
         await self.cupid.close()
         await super().close()
 
-    async def get_or_create_user(
-            self, user: discord.User) -> UserAsAppWithRelationships:
-        """Ensure sure that a user is registered."""
-        try:
-            cupid_user: UserAsAppWithRelationships = await self.app.get_user(
-                user.id,
-            )
-        except NotFoundError:
-            await self.app.create_user(
-                id=user.id,
-                name=user.name,
-                discriminator=user.discriminator,
-                avatar_url=str(user.avatar.url),
-                gender=Gender.NON_BINARY,
-            )
-            return await self.app.get_user(user.id)
+    def register_gauges(self):
+        """Expose the sizes of caches and queues as metrics."""
+        gauges = {
+            'user_cache_size': (
+                'Users in the cache.', lambda: len(self.user_cache),
+            ),
+            'user_fetch_hit_rate': (
+                'Proportion of user fetches sharing another call.',
+                lambda: self.user_fetches.hit_rate,
+            ),
+            'profile_sync_pending': (
+                'Profile updates waiting to be pushed.',
+                lambda: len(self.profile_sync),
+            ),
+            'render_pending': (
+                'Family trees being drawn or waiting to be.',
+                lambda: self.renderer.pending,
+            ),
+            'tree_cache_bytes': (
+                'Bytes of tree images in memory.',
+                lambda: self.tree_cache.size,
+            ),
+            'family_users': (
+                'Users in the family indexes of every guild.',
+                lambda: sum(
+                    len(state.family.users)
+                    for state in self.guild_states.values()
+                ),
+            ),
+            'directory_users': (
+                'Users in the directories of every guild.',
+                lambda: sum(
+                    len(state.directory)
+                    for state in self.guild_states.values()
+                ),
+            ),
+            'live_paginators': (
+                'Paginators accepting button presses.', live_paginators,
+            ),
+            'warmup_seconds': (
+                'Seconds taken to fill the slowest local indexes at startup.',
+                lambda: max(
+                    (state.warmup_seconds
+                     for state in self.guild_states.values()),
+                    default=0,
+                ),
+            ),
+            'api_breaker_open': (
+                'Whether Cupid API calls are failing fast.',
+                lambda: int(self.api.breaker.is_open),
+            ),
+        }
+        for name, (description, read) in gauges.items():
+            REGISTRY.gauge(f'cupid_bot_{name}', description, read)
+
+    async def sync_profile(self, guild_id: int, user: discord.abc.User):
+        """Push a user's profile to a guild's app if it has changed."""
+        state = self.guild_states.get(guild_id)
+        if state:
+            await state.sync_profile(user)
+
+    async def all_members(
+            self,
+            guild: discord.Guild) -> typing.AsyncIterator[discord.Member]:
+        """Iterate over a guild's members, fetching them if not cached."""
+        if CONFIG.member_cache_light:
+            async for member in guild.fetch_members(limit=None):
+                yield member
         else:
-            await cupid_user.edit(
-                name=user.name,
-                discriminator=user.discriminator,
-                avatar_url=str(user.avatar.url).split('?')[0],
-            )
-            return cupid_user
+            for member in guild.members:
+                yield member
 
     async def global_check(self, ctx: 'Context') -> bool:
-        """Register users and ensure commands are used in the right guild."""
-        if (not ctx.guild) or ctx.guild.id != CONFIG.guild_id:
+        """Register users and ensure commands are used in a served guild."""
+        state = self.guild_state(ctx.guild)
+        if not state:
+            names = ', '.join(
+                f'**{guild.name}**' for guild in CONFIG.guilds.values()
+            )
             raise commands.CommandError(
-                f'This bot can only be used in **{CONFIG.guild_name}**.',
+                f'This bot can only be used in {names}.',
             )
-        ctx.cupid_user = await self.get_or_create_user(ctx.author)
+        ctx.guild_state = state
+        if not state.warmed_up.is_set():
+            try:
+                await asyncio.wait_for(
+                    state.warmed_up.wait(), CONFIG.warmup_wait,
+                )
+            except asyncio.TimeoutError:
+                raise StillWarmingUp() from None
+        ctx.cupid_user = await state.get_or_create_user(ctx.author)
         return True
 
     async def on_user_update(self, before: discord.User, after: discord.User):
         """Keep users up to date with the API."""
         if after.bot:
             return
-        await self.get_or_create_user(after)
+        for state in self.guild_states.values():
+            if state.knows(after.id):
+                self.profile_sync.push(state.id, after)
 
     async def on_message(self, message: discord.Message):
         """Send the prefix if the bot is mentioned."""
         await super().on_message(message)
         me = message.guild.me if message.guild else self.user
         if me in message.mentions:
-            await message.channel.send(f'My prefix is `{CONFIG.prefix}`.')
+            prefix = get_prefix(self, message)
+            await message.channel.send(f'My prefix is `{prefix}`.')
+
+    async def on_command(self, ctx: 'Context'):
+        """Note when a command started, to time it."""
+        ctx.started_at = time.perf_counter()
+
+    async def on_command_completion(self, ctx: 'Context'):
+        """Record how long a command took."""
+        self.observe_command(ctx, 'ok')
 
     async def on_command_error(self, ctx: 'Context', error: Exception):
         """Handle an error."""
+        self.observe_command(ctx, 'error')
         await errors.on_command_error(ctx, error)
+
+    def observe_command(self, ctx: 'Context', outcome: str):
+        """Record how long a command took, if it was invoked."""
+        started_at = getattr(ctx, 'started_at', None)
+        if ctx.command and started_at is not None:
+            COMMAND_SECONDS.observe(
+                time.perf_counter() - started_at,
+                command=ctx.command.qualified_name,
+                outcome=outcome,
+            )
+
+
+class ShardedCupidBot(CupidBot, commands.AutoShardedBot):
+    """The Cupid bot, split across several gateway connections.
+
+    Each process can run a subset of the shards by setting `shard_ids`.
+    """
+
+    def __init__(self):
+        """Set up the bot with the configured shards."""
+        super().__init__(
+            shard_count=CONFIG.shard_count, shard_ids=CONFIG.shard_ids,
+        )
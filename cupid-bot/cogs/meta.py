@@ -1,15 +1,80 @@
 """The meta cog."""
+import asyncio
+import copy
+import io
 import typing
 
 import discord
 from discord.ext import commands
 
-from ..config import CONFIG
+from ..utils.metrics import (
+    API_CALL_SECONDS,
+    COMMAND_SECONDS,
+    Histogram,
+    REGISTRY,
+    RENDERS_REJECTED,
+    RENDER_QUEUE_SECONDS,
+    RENDER_SECONDS,
+    TENOR_SECONDS,
+)
+from ..utils.profiler import Profile, Profiler
 
 if typing.TYPE_CHECKING:
     from ..bot import CupidBot
 
 
+QUANTILES = (0.5, 0.95, 0.99)
+
+# The longest report to send as a message rather than a file.
+MAX_MESSAGE_LENGTH = 1900
+
+# The longest time the whole bot can be profiled for, in seconds.
+MAX_PROFILE_SECONDS = 300
+
+# How many functions to list in a profile summary.
+PROFILE_TOP = 8
+
+
+def format_latencies(title: str, histogram: Histogram) -> list[str]:
+    """Summarise each set of labels in a histogram as one line."""
+    lines = [f'{title:<28} {"count":>6} {"p50":>6} {"p95":>6} {"p99":>6}']
+    for labels in histogram.label_sets():
+        name = '/'.join(labels.values()) or 'all'
+        times = ' '.join(
+            f'{histogram.quantile(quantile, **labels) * 1000:6.0f}'
+            for quantile in QUANTILES
+        )
+        lines.append(f'{name:<28} {histogram.count(**labels):>6} {times}')
+    return lines + ['']
+
+
+def text_file(text: str, filename: str) -> discord.File:
+    """Wrap some text as a file to upload."""
+    return discord.File(io.BytesIO(text.encode('utf-8')), filename)
+
+
+async def send_report(
+        ctx: commands.Context,
+        report: str,
+        filename: str,
+        files: tuple[discord.File, ...] = ()):
+    """Send a report in a code block, or as a file if it is too long."""
+    if len(report) > MAX_MESSAGE_LENGTH:
+        await ctx.send(files=[text_file(report, filename), *files])
+    else:
+        await ctx.send(f'```\n{report}\n```', files=list(files))
+
+
+async def send_profile(ctx: commands.Context, profile: Profile):
+    """Send a summary of a profile, with its collapsed stacks attached."""
+    await send_report(
+        ctx,
+        profile.summary(PROFILE_TOP),
+        'profile.txt',
+        (text_file(profile.collapsed(), 'profile.folded'),),
+    )
+
+
 class Meta(commands.Cog):
     """Commands relating to the bot itself."""
 
@@ -25,8 +90,81 @@ class Meta(commands.Cog):
         embed = discord.Embed(
             title='About',
             description=ctx.bot.description,
-            colour=CONFIG.accent_colour_int,
+            colour=ctx.guild_state.config.accent_colour_int,
         )
         embed.set_thumbnail(url=ctx.bot.user.avatar.url)
         embed.set_footer(text='By Artemis (artemisdev.xyz).')
         await ctx.send(embed=embed)
+
+    @commands.command(brief='Performance statistics.', hidden=True)
+    @commands.is_owner()
+    async def stats(self, ctx: commands.Context):
+        """Show request counts and latencies since the bot started.
+
+        Latencies are in milliseconds, estimated from histogram buckets.
+        """
+        lines = [
+            *format_latencies('Commands', COMMAND_SECONDS),
+            *format_latencies('Cupid API', API_CALL_SECONDS),
+            *format_latencies('Tenor', TENOR_SECONDS),
+            *format_latencies('Rendering', RENDER_SECONDS),
+            *format_latencies('Render queue', RENDER_QUEUE_SECONDS),
+            f'renders_rejected: {RENDERS_REJECTED.total():g}',
+        ]
+        for name, metric in REGISTRY.metrics.items():
+            if metric.kind == 'gauge':
+                lines.append(
+                    f'{name.removeprefix("cupid_bot_")}: {metric.read():g}',
+                )
+        await send_report(ctx, '\n'.join(lines), 'stats.txt')
+
+    @commands.group(
+        brief='Profile the bot.', hidden=True, invoke_without_command=True,
+    )
+    @commands.is_owner()
+    @commands.max_concurrency(1)
+    async def profiler(self, ctx: commands.Context, seconds: float = 10):
+        """Sample where the bot spends its time for a number of seconds.
+
+        The summary lists the functions threads were busy in, and the
+        coroutines tasks were waiting in. The attached file can be turned
+        into a flamegraph.
+        """
+        if not 0 < seconds <= MAX_PROFILE_SECONDS:
+            raise commands.BadArgument(
+                f'Seconds must be between 0 and {MAX_PROFILE_SECONDS}.',
+            )
+        profiler = Profiler()
+        profiler.start()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            profile = await profiler.stop()
+        await send_profile(ctx, profile)
+
+    # Checks on the group aren't run for its subcommands, since it can be
+    # invoked without one.
+    @profiler.command(name='run', brief='Profile a command.')
+    @commands.is_owner()
+    @commands.max_concurrency(1)
+    async def profiler_run(self, ctx: commands.Context, *, command: str):
+        """Profile a single use of a command, such as `tree @user`.
+
+        Only tasks started by the command are included in the task waits.
+        """
+        message = copy.copy(ctx.message)
+        message.content = ctx.prefix + command
+        command_ctx = await self.bot.get_context(message, cls=type(ctx))
+        if not command_ctx.command:
+            raise commands.BadArgument(f'No command called "{command}".')
+        existing = asyncio.all_tasks()
+        current = asyncio.current_task()
+        profiler = Profiler(
+            include=lambda task: task is current or task not in existing,
+        )
+        profiler.start()
+        try:
+            await self.bot.invoke(command_ctx)
+        finally:
+            profile = await profiler.stop()
+        await send_profile(ctx, profile)
@@ -1,22 +1,28 @@
 """Cog for commands relating to users."""
+import functools
+import io
 from typing import Optional, TYPE_CHECKING
 
+from cupid.annotations import User
+
 import discord
 from discord.ext.commands import Cog, command
 
 from ..config import CONFIG
 from ..utils import Context
-from ..utils.converters import CupidUser, GenderConverter
-from ..utils.graph import render_graph
-from ..utils.pagination import Paginator
+from ..utils.converters import CupidUser, GenderConverter, TreeOptions
+from ..utils.family import FamilyGraph, FamilyIndex
+from ..utils.pagination import PageSource, Paginator
 from ..utils.sentences import (
     gender,
     get_gender_data,
     relationship_to,
 )
+from ..utils.warmup import Pages
 
 if TYPE_CHECKING:
     from ..bot import CupidBot
+    from ..guilds import GuildState
 
 
 class People(Cog):
@@ -42,7 +48,7 @@ class People(Cog):
             lines.append(relationship_to(user, relationship))
         embed = discord.Embed(
             title=user.name,
-            colour=CONFIG.accent_colour_int,
+            colour=ctx.guild_state.config.accent_colour_int,
             description='\n'.join(lines),
         )
         embed.set_thumbnail(url=user.avatar_url)
@@ -60,10 +66,17 @@ class People(Cog):
 
         Note: at present, the bot only supports non-binary, female and male.
         """
-        await ctx.cupid_user.edit(gender=new_gender)
+        await self.bot.api.write(
+            lambda: ctx.cupid_user.edit(gender=new_gender),
+        )
+        ctx.guild_state.remember_user(ctx.cupid_user)
         gender_name = gender(ctx.cupid_user)
         await ctx.send(f'Set your gender to {gender_name}.')
 
+    async def read_page(self, users: Pages, number: int) -> list[User]:
+        """Fetch a page of users from the API."""
+        return await self.bot.api.read(lambda: users.get_page(number))
+
     @command(brief='See a list of people.', aliases=['people', 'l', 'search'])
     async def list(self, ctx: Context, *, search: Optional[str] = None):
         """Get a list of people registered, optionally with a search.
@@ -72,32 +85,78 @@ class People(Cog):
         `[p]list`
         `[p]search Rob`
         """
-        users = self.bot.app.users(search=search)
-        await users.get_page(0)    # Fetch a page to load metadata.
+        state = ctx.guild_state
+        if state.directory.ready:
+            # Searching the directory doesn't use the API, so it works even
+            # while the API is down.
+            users = state.directory.search(search or '')
+            get_page = users.get_page
+        else:
+            users = state.app.users(search=search)
+            get_page = functools.partial(self.read_page, users)
+        first_page = await get_page(0)    # Also loads metadata.
         await Paginator(
             ctx=ctx,
             title='People',
-            page_count=users.total_pages,
-            get_page=users.get_page,
+            source=PageSource(
+                page_count=users.total_pages,
+                get_page=get_page,
+                pages={0: first_page},
+            ),
             formatter=lambda user: (
                 f'{get_gender_data(user.gender).emoji} {user.name} ({user.id})'
             ),
         ).setup()
 
+    async def get_graph(
+            self,
+            state: 'GuildState',
+            user: Optional[CupidUser],
+            depth: Optional[int],
+            limit: int) -> FamilyGraph:
+        """Get the graph for a tree, from the local index if it's ready."""
+        family = state.family
+        if not family.ready:
+            family = FamilyIndex.from_graph(await self.bot.api.read(
+                user.graph if user else state.app.graph,
+            ))
+        if user:
+            return family.component(user, depth=depth, limit=limit)
+        return family.graph(limit=limit)
+
     @command(brief='See a family tree.')
-    async def tree(self, ctx: Context, user: CupidUser = None):
+    async def tree(
+            self,
+            ctx: Context,
+            user: Optional[CupidUser] = None,
+            *,
+            options: TreeOptions = None):
         """See a family tree with every person.
 
         Optionally, filter by user to only see people related (even indirectly)
-        to that user.
+        to that user. You can also limit how many relationships away from
+        them to go with `depth`, or the maximum number of people to show with
+        `limit`. If you give a depth but no user, your own tree is shown.
 
         Examples:
         `[p]tree`
         `[p]tree @Artemis`
+        `[p]tree @Artemis depth=2`
+        `[p]tree limit=50`
         """
-        if user:
-            graph = await user.graph()
-        else:
-            graph = await self.bot.app.graph()
-        file = render_graph(graph)
-        await ctx.send(file=discord.File(file, filename='tree.png'))
+        depth = options.depth if options else None
+        limit = CONFIG.tree_max_nodes
+        if options and options.limit is not None:
+            limit = min(options.limit, limit)
+        if depth is not None and not user:
+            user = ctx.cupid_user
+        image = await self.bot.tree_cache.get(
+            (ctx.guild_state.id, user.id if user else None, depth, limit),
+            functools.partial(
+                self.get_graph, ctx.guild_state, user, depth, limit,
+            ),
+            self.bot.renderer.render,
+        )
+        await ctx.send(file=discord.File(
+            io.BytesIO(image), filename='tree.png',
+        ))
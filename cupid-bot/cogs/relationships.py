@@ -1,17 +1,26 @@
 """Cog for commands relating to relationships."""
-from typing import Any, Callable, Coroutine, TYPE_CHECKING
+import asyncio
+from typing import Optional, TYPE_CHECKING
 
-from cupid import ForbiddenError, RelationshipKind
+from cupid import ForbiddenError, NotFoundError, RelationshipKind
 from cupid.annotations import OwnRelationship
 
-from discord import ButtonStyle, Embed, Interaction
+from discord import (
+    ButtonStyle,
+    Embed,
+    HTTPException,
+    Interaction,
+    InteractionType,
+    Message,
+    User,
+)
 from discord.ext.commands import Cog, command
-from discord.ui import Button, View, button
+from discord.ui import Button, View
 
-from ..config import CONFIG
+from ..config import BUNDLED_GIF_URL, CONFIG
 from ..utils import Context
 from ..utils.converters import CupidUser
-from ..utils.gifs import proposal_gif
+from ..utils.gifs import PROPOSAL_TERMS, gif_attachment
 from ..utils.sentences import (
     delete_confirmation,
     incoming_proposals,
@@ -20,91 +29,242 @@ from ..utils.sentences import (
     rejection_confirmation,
     relationship_announcement,
 )
+from ..utils.slash import InteractionContext
+from ..utils.warmup import StillWarmingUp
 
 if TYPE_CHECKING:
     from ..bot import CupidBot
+    from ..guilds import GuildState
+
+
+def proposal_button_id(action: str, proposal: OwnRelationship) -> str:
+    """Get the custom ID for a button on a proposal."""
+    return f'proposal:{action}:{proposal.initiator.id}:{proposal.other.id}'
+
+
+def parse_proposal_button_id(
+        custom_id: str) -> Optional[tuple[str, int, int]]:
+    """Get the action, initiator ID and other ID from a proposal button."""
+    parts = custom_id.split(':')
+    if len(parts) != 4 or parts[0] != 'proposal':
+        return None
+    try:
+        return parts[1], int(parts[2]), int(parts[3])
+    except ValueError:
+        return None
+
+
+def answer_hint(ctx: Context) -> str:
+    """Say how to answer a proposal with commands instead of buttons."""
+    if isinstance(ctx, InteractionContext):
+        # Aliases such as reject aren't registered as application commands.
+        accept, reject = '/accept other:', '/leave other:'
+    else:
+        accept, reject = f'{ctx.prefix}accept', f'{ctx.prefix}reject'
+    return (
+        f'You can also use "{accept} @{ctx.author}" or '
+        f'"{reject} @{ctx.author}".'
+    )
+
+
+def press_refusal(
+        state: 'GuildState', user_id: int, other_id: int) -> Optional[str]:
+    """Get why a user can't answer a proposal, if they can't."""
+    if not state.warmed_up.is_set():
+        return str(StillWarmingUp())
+    if user_id != other_id:
+        return 'This proposal is not to you.'
+    return None
 
 
 class ProposalView(View):
-    """A view that allows a user to accept or a reject a proposal."""
+    """The buttons to accept or reject a proposal.
+
+    The view is only used to send the buttons. Presses are handled by
+    `Relationships.on_interaction` based on the button's custom ID, so no
+    state is kept per proposal and the buttons still work after a restart.
+    """
 
     children: list[Button]
 
     def __init__(self, proposal: OwnRelationship):
         """Set up the view buttons."""
-        self.proposal = proposal
         super().__init__(timeout=None)
+        self.add_item(Button(
+            label='Accept',
+            style=ButtonStyle.success,
+            emoji='\N{TWO HEARTS}',
+            custom_id=proposal_button_id('accept', proposal),
+        ))
+        self.add_item(Button(
+            label='Reject',
+            style=ButtonStyle.danger,
+            emoji='\N{BROKEN HEART}',
+            custom_id=proposal_button_id('reject', proposal),
+        ))
 
-    async def on_button(
-            self,
-            interaction: Interaction,
-            callback: Callable[[], Coroutine[Any, Any, None]]) -> bool:
-        """Handle either button being pressed.
 
-        Return value indicates whether or not it was successful.
-        """
-        if (
-                self.proposal.accepted
-                or interaction.user.id != self.proposal.other.id):
-            await interaction.response.send_message(
-                'This proposal is not to you.', ephemeral=True,
+class Relationships(Cog):
+    """Commands relating to relationships."""
+
+    def __init__(self, bot: 'CupidBot'):
+        """Store a reference to the bot."""
+        self.bot = bot
+        # Tasks adding GIFs to proposals, kept so they aren't garbage
+        # collected before they finish.
+        self.gif_attachments: set[asyncio.Task] = set()
+
+    @Cog.listener()
+    async def on_interaction(self, interaction: Interaction):
+        """Handle a proposal button being pressed."""
+        press = await self.resolve_press(interaction)
+        if not press:
+            return
+        state, action, proposal = press
+        if not proposal:
+            await interaction.message.edit(view=None)
+            await interaction.followup.send(
+                'This proposal no longer exists.', ephemeral=True,
             )
-            return False
+            return
         try:
-            await callback()
+            await self.bot.api.write(
+                proposal.accept if action == 'accept' else proposal.delete,
+            )
         except ForbiddenError as error:
-            await interaction.response.send_message(str(error), ephemeral=True)
-            return False
-        await interaction.response.edit_message(view=None)
-        return True
-
-    @button(label='Accept', style=ButtonStyle.success, emoji='\N{TWO HEARTS}')
-    async def accept(self, button: Button, interaction: Interaction):
-        """Handle the user pressing the accept button."""
-        if not await self.on_button(interaction, self.proposal.accept):
+            await interaction.followup.send(str(error), ephemeral=True)
             return
-        await interaction.followup.send(relationship_announcement(
-            self.proposal,
-        ))
+        state.record_relationship(proposal, removed=action != 'accept')
+        await interaction.message.edit(view=None)
+        if action == 'accept':
+            await interaction.followup.send(
+                relationship_announcement(proposal),
+            )
+        else:
+            await interaction.followup.send(
+                rejection_confirmation(proposal), ephemeral=True,
+            )
 
-    @button(label='Reject', style=ButtonStyle.danger, emoji='\N{BROKEN HEART}')
-    async def reject(self, button: Button, interaction: Interaction):
-        """Handle the user pressing the reject button."""
-        if not await self.on_button(interaction, self.proposal.delete):
-            return
-        await interaction.followup.send(
-            rejection_confirmation(self.proposal), ephemeral=True,
+    def parse_press(
+            self,
+            interaction: Interaction,
+    ) -> Optional[tuple['GuildState', str, int, int]]:
+        """Get the guild, action, initiator ID and other ID of a press.
+
+        Returns None for anything but a proposal button in a served guild.
+        """
+        if interaction.type != InteractionType.component:
+            return None
+        button = parse_proposal_button_id(
+            interaction.data.get('custom_id', ''),
         )
+        state = self.bot.guild_state(interaction.guild)
+        if not (button and state):
+            return None
+        return (state, *button)
 
+    async def resolve_press(
+            self,
+            interaction: Interaction,
+    ) -> Optional[tuple['GuildState', str, Optional[OwnRelationship]]]:
+        """Check a proposal button press, and find the proposal.
 
-class Relationships(Cog):
-    """Commands relating to relationships."""
+        Presses which can't be handled are responded to here. Otherwise the
+        interaction is deferred, since finding the proposal can take longer
+        than Discord waits for a response. The proposal is None if it no
+        longer exists.
+        """
+        press = self.parse_press(interaction)
+        if not press:
+            return None
+        state, action, initiator_id, other_id = press
+        refusal = press_refusal(state, interaction.user.id, other_id)
+        if refusal:
+            await interaction.response.send_message(refusal, ephemeral=True)
+            return None
+        await interaction.response.defer()
+        proposal = await self.find_proposal(
+            state, interaction.user, initiator_id,
+        )
+        return state, action, proposal
 
-    def __init__(self, bot: 'CupidBot'):
-        """Store a reference to the bot."""
-        self.bot = bot
+    async def find_proposal(
+            self,
+            state: 'GuildState',
+            user: User,
+            initiator_id: int) -> Optional[OwnRelationship]:
+        """Find a pending proposal to a user."""
+        other = await state.get_or_create_user(user)
+        try:
+            initiator = await state.get_cupid_user(initiator_id)
+            proposal = await self.bot.api.read(
+                lambda: other.relationship(initiator),
+            )
+        except NotFoundError:
+            return None
+        return None if proposal.accepted else proposal
 
     async def propose_either(
             self, ctx: Context, to: CupidUser, kind: RelationshipKind):
-        """Handle a proposal of marriage or adoption."""
-        await ctx.cupid_user.propose(to, kind)
-        proposal = await to.relationship(ctx.cupid_user)
-        await ctx.send(
-            f'<@{to.id}>',
-            embed=Embed(
-                title=proposal_announcement(proposal),
-                color=CONFIG.accent_colour_int,
-            ).set_footer(
-                text=(
-                    'If the buttons timeout, you can use '
-                    f'"{ctx.prefix}accept @{ctx.author}" or '
-                    f'"{ctx.prefix}reject @{ctx.author}".'
-                ),
-            ).set_image(
-                url=await proposal_gif(self.bot.cupid, proposal),
-            ),
-            view=ProposalView(proposal),
+        """Handle a proposal of marriage or adoption.
+
+        The GIF is fetched while the proposal is made. If it isn't ready
+        within the latency budget, the proposal is sent without it and the
+        GIF is added when it arrives.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + CONFIG.proposal_gif_budget
+        gif_task = asyncio.create_task(self.bot.gifs.get(PROPOSAL_TERMS[kind]))
+        try:
+            await self.bot.api.write(lambda: ctx.cupid_user.propose(to, kind))
+            proposal = await self.bot.api.read(
+                lambda: to.relationship(ctx.cupid_user),
+            )
+        except BaseException:
+            gif_task.cancel()
+            raise
+        ctx.guild_state.record_relationship(proposal)
+        embed = Embed(
+            title=proposal_announcement(proposal),
+            color=ctx.guild_state.config.accent_colour_int,
+        ).set_footer(text=answer_hint(ctx))
+        try:
+            gif = await asyncio.wait_for(
+                asyncio.shield(gif_task), max(deadline - loop.time(), 0),
+            )
+        except asyncio.TimeoutError:
+            gif = None
+        if gif:
+            embed.set_image(url=gif)
+        view = ProposalView(proposal)
+        message = await ctx.send(
+            f'<@{to.id}>', embed=embed, view=view, **gif_attachment(gif),
         )
+        # Presses are handled by custom ID, so the view needn't be stored.
+        view.stop()
+        if not gif:
+            task = asyncio.create_task(
+                self.attach_gif(message, embed, gif_task),
+            )
+            self.gif_attachments.add(task)
+            task.add_done_callback(self.gif_attachments.discard)
+
+    async def attach_gif(
+            self,
+            message: Message,
+            embed: Embed,
+            gif_task: 'asyncio.Task[str]'):
+        """Add a GIF to a proposal that was sent without one, if it arrives.
+
+        Failures are ignored, since the proposal works without the GIF. So is
+        the bundled GIF, since files can't be attached by editing a message.
+        """
+        try:
+            gif = await asyncio.wait_for(gif_task, CONFIG.proposal_gif_timeout)
+            if gif != BUNDLED_GIF_URL:
+                await message.edit(embed=embed.set_image(url=gif))
+        except (HTTPException, asyncio.TimeoutError):
+            pass
 
     @command(brief='Propose to someone.')
     async def propose(self, ctx: Context, *, to: CupidUser):
@@ -131,8 +291,11 @@ class Relationships(Cog):
         Example:
         `[p]accept @Artemis`
         """
-        relationship = await ctx.cupid_user.relationship(other)
-        await relationship.accept()
+        relationship = await self.bot.api.read(
+            lambda: ctx.cupid_user.relationship(other),
+        )
+        await self.bot.api.write(relationship.accept)
+        ctx.guild_state.record_relationship(relationship)
         await ctx.send(relationship_announcement(relationship))
 
     @command(
@@ -153,8 +316,11 @@ class Relationships(Cog):
         `[p]divorce @Eris`
         `[p]disown @Flora`
         """
-        relationship = await ctx.cupid_user.relationship(other)
-        await relationship.delete()
+        relationship = await self.bot.api.read(
+            lambda: ctx.cupid_user.relationship(other),
+        )
+        await self.bot.api.write(relationship.delete)
+        ctx.guild_state.record_relationship(relationship, removed=True)
         await ctx.send(delete_confirmation(ctx.cupid_user, relationship))
 
     @command(brief='See your proposals.')
@@ -167,7 +333,7 @@ class Relationships(Cog):
         await ctx.send(
             embed=Embed(
                 title='Proposals',
-                color=CONFIG.accent_colour_int,
+                color=ctx.guild_state.config.accent_colour_int,
             ).set_author(
                 name=ctx.cupid_user.name,
                 icon_url=ctx.cupid_user.avatar_url,
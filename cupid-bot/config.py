@@ -5,12 +5,38 @@ import configparser
 import os
 import pathlib
 import sys
-from typing import Any
+from typing import Any, Optional
 
 import pydantic
 from pydantic.color import Color
 
 
+# Config file sections for per-guild settings are named this plus the ID.
+GUILD_SECTION = 'guild.'
+# Per-guild settings which default to the top level setting of the same name.
+GUILD_DEFAULTS = ('cupid_token', 'prefix', 'accent_colour')
+# A GIF for proposals when none can be fetched, which is attached to messages
+# rather than linked to.
+BUNDLED_GIF = pathlib.Path(__file__).parent / 'assets' / 'proposal.gif'
+BUNDLED_GIF_URL = f'attachment://{BUNDLED_GIF.name}'
+
+
+class GuildConfig(pydantic.BaseModel):
+    """Settings for one Discord server."""
+
+    id: int
+    name: str
+    cupid_token: str
+    prefix: str
+    accent_colour: Color
+
+    @property
+    def accent_colour_int(self) -> int:
+        """Get the accent colour as a number."""
+        r, g, b = self.accent_colour.as_rgb_tuple(alpha=False)
+        return r << 16 | g << 8 | b
+
+
 class _Config(pydantic.BaseModel):
     """Config fields."""
 
@@ -19,15 +45,77 @@ class _Config(pydantic.BaseModel):
     tenor_token: str
     cupid_api_url: str = 'https://cupid-api.artemisdev.xyz'
     prefix: str = '?'
+    prefix_commands: bool = True
     guild_id: int = 839867213196427264
     guild_name: str = 'Polytics'
     accent_colour: Color = Color('#ff2fd6')
-
-    @property
-    def accent_colour_int(self) -> int:
-        """Get the accent colour as a number."""
-        r, g, b = self.accent_colour.as_rgb_tuple(alpha=False)
-        return r << 16 | g << 8 | b
+    guilds: dict[int, GuildConfig] = {}
+    sharded: bool = False
+    shard_count: Optional[int] = None
+    shard_ids: Optional[list[int]] = None
+    user_cache_size: int = 1000
+    user_cache_ttl: float = 300
+    member_cache_light: bool = False
+    member_cache_size: int = 1000
+    member_cache_ttl: float = 300
+    profile_sync_concurrency: int = 4
+    profile_sync_batch_size: int = 20
+    render_workers: int = 2
+    render_timeout: float = 30
+    render_queue_size: int = 8
+    tree_cache_bytes: int = 32 * 2**20
+    tree_cache_ttl: float = 60
+    tree_cache_dir: Optional[pathlib.Path] = None
+    family_reconcile_interval: float = 600
+    warmup_concurrency: int = 8
+    warmup_wait: float = 5
+    tree_max_nodes: int = 300
+    gif_pool_low: int = 5
+    gif_pool_high: int = 20
+    fallback_gif_url: str = BUNDLED_GIF_URL
+    proposal_gif_budget: float = 0.5
+    proposal_gif_timeout: float = 10
+    paginator_timeout: float = 300
+    paginator_max_live: int = 100
+    http_pool_size: int = 10
+    http_keepalive: float = 30
+    http_dns_ttl: int = 300
+    http_connect_timeout: float = 3
+    http_read_timeout: float = 5
+    api_timeout: float = 10
+    api_retries: int = 2
+    api_backoff: float = 0.5
+    api_breaker_threshold: int = 5
+    api_breaker_reset: float = 30
+    metrics_host: str = '127.0.0.1'
+    metrics_port: Optional[int] = None
+
+    @pydantic.validator('guilds', pre=True, always=True)
+    def _fill_guilds(
+            cls,
+            guilds: dict[Any, dict[str, Any]],
+            values: dict[str, Any]) -> dict[Any, dict[str, Any]]:
+        """Fill in per-guild settings from the top level settings.
+
+        If no guilds are configured, only `guild_id` is served.
+        """
+        if not guilds:
+            guild_id = values.get('guild_id')
+            guilds = {guild_id: {'name': values.get('guild_name')}}
+        defaults = {
+            key: values[key] for key in GUILD_DEFAULTS if key in values
+        }
+        return {
+            guild_id: {'id': guild_id, **defaults, **settings}
+            for guild_id, settings in guilds.items()
+        }
+
+    @pydantic.validator('shard_ids', pre=True)
+    def _split_shard_ids(cls, shard_ids: Any) -> Any:
+        """Allow shard IDs to be given as a comma separated list."""
+        if isinstance(shard_ids, str):
+            return [part for part in shard_ids.split(',') if part.strip()]
+        return shard_ids
 
 
 class Config:
@@ -57,13 +145,19 @@ def _get_config_data() -> dict[str, Any]:
     parser = configparser.ConfigParser()
     if parser.read(BASE_PATH / 'config.ini'):
         data.update(normalise_options(parser['cupid-bot']))
+        data['guilds'] = {
+            section[len(GUILD_SECTION):]: normalise_options(parser[section])
+            for section in parser.sections()
+            if section.startswith(GUILD_SECTION)
+        }
     return data
 
 
-def load():
-    """Load config options."""
+def load(**overrides: Any):
+    """Load config options, optionally overriding some."""
     global _CONFIG
     data = _get_config_data()
+    data.update(overrides)
     try:
         _CONFIG = _Config(**data)
     except pydantic.ValidationError as error:
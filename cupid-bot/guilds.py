@@ -0,0 +1,242 @@
+"""State for each Discord server the bot serves."""
+import asyncio
+import logging
+import time
+import typing
+
+from cupid import Gender, NotFoundError
+from cupid.annotations import (
+    Relationship,
+    User,
+    UserAsAppWithRelationships,
+)
+
+import discord
+
+from .config import CONFIG, GuildConfig
+from .utils.directory import UserDirectory
+from .utils.family import FamilyIndex
+from .utils.warmup import fetch_all_pages
+
+if typing.TYPE_CHECKING:
+    from .bot import CupidBot
+
+
+logger = logging.getLogger(__name__)
+
+
+AnyUser = typing.Union[discord.abc.User, User]
+
+
+def profile_fields(user: AnyUser) -> dict[str, str]:
+    """Get the profile fields that are synced from Discord to Cupid."""
+    if isinstance(user, discord.abc.User):
+        avatar_url = str(user.avatar.url).split('?')[0]
+    else:
+        avatar_url = user.avatar_url
+    return {
+        'name': user.name,
+        'discriminator': user.discriminator,
+        'avatar_url': avatar_url,
+    }
+
+
+class GuildState:
+    """The Cupid app and local indexes for one Discord server.
+
+    Each server has its own Cupid app, so users and relationships are never
+    shared between servers. Entries in the bot's shared caches are keyed by
+    server ID as well as user ID.
+    """
+
+    def __init__(self, bot: 'CupidBot', config: GuildConfig):
+        """Set up the empty indexes."""
+        self.bot = bot
+        self.config = config
+        self.id = config.id
+        # Set once authenticated, during the warm-up.
+        self.app = None
+        self.family = FamilyIndex()
+        self.directory = UserDirectory()
+        self.warmed_up = asyncio.Event()
+        self.warmup_task: typing.Optional[asyncio.Task] = None
+        self.warmup_seconds = 0.0
+        self.family_task: typing.Optional[asyncio.Task] = None
+
+    def start(self):
+        """Start warming up, unless that has already been done."""
+        if not self.warmup_task:
+            self.warmup_task = asyncio.create_task(self.warm_up())
+
+    def close(self):
+        """Stop the background tasks."""
+        for task in (self.warmup_task, self.family_task):
+            if task:
+                task.cancel()
+
+    async def warm_up(self):
+        """Authenticate with the API and fill the local indexes, once.
+
+        Commands wait for this to finish (up to a limit). If the indexes
+        can't be filled, commands are still allowed, and fall back to the
+        API until the indexes are next reconciled.
+        """
+        start = time.perf_counter()
+        while not self.app:
+            try:
+                self.app = await self.bot.api.read(
+                    lambda: self.bot.cupid.app(self.config.cupid_token),
+                )
+            except Exception:
+                logger.exception(
+                    'Failed to authenticate with the Cupid API for %s.',
+                    self.config.name,
+                )
+                await asyncio.sleep(CONFIG.api_breaker_reset)
+        print(
+            f'Cupid API: Logged in to {self.config.name} as {self.app.name}.',
+        )
+        try:
+            await self.refresh_indexes()
+        except Exception:
+            logger.exception('Failed to fill the local indexes.')
+        self.warmup_seconds = time.perf_counter() - start
+        self.warmed_up.set()
+        self.family_task = asyncio.create_task(self.maintain_family())
+        print(f'Warmed up {self.config.name} in {self.warmup_seconds:.2f}s.')
+
+    async def get_or_create_user(
+            self, user: discord.User) -> UserAsAppWithRelationships:
+        """Ensure sure that a user is registered.
+
+        Users are served from the cache where possible. Profiles are kept
+        up to date by `on_user_update` and `reconcile_profiles`, rather than
+        being checked here.
+        """
+        cupid_user = self.bot.user_cache.get((self.id, user.id))
+        if cupid_user:
+            return cupid_user
+        try:
+            cupid_user = await self.get_cupid_user(user.id)
+        except NotFoundError:
+            await self.bot.api.write(lambda: self.app.create_user(
+                id=user.id, gender=Gender.NON_BINARY, **profile_fields(user),
+            ))
+            cupid_user = await self.get_cupid_user(user.id)
+            self.remember_user(cupid_user)
+        self.bot.user_cache.set((self.id, user.id), cupid_user)
+        return cupid_user
+
+    def knows(self, user_id: int) -> bool:
+        """Check if a user is likely to be registered with this server's app.
+
+        If the directory isn't ready, every user might be.
+        """
+        return (
+            (self.id, user_id) in self.bot.user_cache
+            or not self.directory.ready
+            or user_id in self.directory
+        )
+
+    async def sync_profile(self, user: discord.abc.User):
+        """Push a user's profile to the API if it has changed."""
+        cupid_user = self.bot.user_cache.get((self.id, user.id))
+        if not cupid_user:
+            try:
+                cupid_user = await self.get_cupid_user(user.id)
+            except NotFoundError:
+                # They will be registered when they first use a command.
+                return
+            self.bot.user_cache.set((self.id, user.id), cupid_user)
+        profile = profile_fields(user)
+        if profile_fields(cupid_user) != profile:
+            await self.bot.api.write(lambda: cupid_user.edit(**profile))
+            self.remember_user(cupid_user)
+
+    async def get_cupid_user(
+            self, user_id: int) -> UserAsAppWithRelationships:
+        """Fetch a user from the API, bypassing the cache.
+
+        If the same user is already being fetched, that result is shared.
+        """
+        return await self.bot.user_fetches.do(
+            (self.id, user_id),
+            lambda: self.bot.api.read(lambda: self.app.get_user(user_id)),
+        )
+
+    def get_member(self, member_id: int) -> typing.Optional[discord.Member]:
+        """Get a member from the member cache."""
+        return self.bot.member_cache.get((self.id, member_id))
+
+    def cache_member(self, member: discord.Member):
+        """Store a member in the member cache."""
+        self.bot.member_cache.set((self.id, member.id), member)
+
+    def invalidate_users(self, *user_ids: int):
+        """Drop cached data for users whose relationships may have changed."""
+        for user_id in user_ids:
+            self.bot.user_cache.pop((self.id, user_id))
+        self.bot.tree_cache.invalidate(self.id, user_ids)
+
+    def remember_user(self, user: UserAsAppWithRelationships):
+        """Update local indexes with a user's latest details."""
+        self.family.add_user(user)
+        self.directory.add(user)
+
+    def record_relationship(
+            self, relationship: Relationship, removed: bool = False):
+        """Update local state after a relationship is changed."""
+        if removed:
+            self.family.remove(relationship)
+        else:
+            self.family.add(relationship)
+        self.invalidate_users(
+            relationship.initiator.id, relationship.other.id,
+        )
+
+    async def refresh_indexes(self):
+        """Fetch every user and the whole graph, and reload the indexes."""
+        self.family.begin_reconcile()
+        try:
+            graph, users = await asyncio.gather(
+                self.bot.api.read(self.app.graph),
+                fetch_all_pages(
+                    self.app.users(), self.bot.api, CONFIG.warmup_concurrency,
+                ),
+            )
+            self.family.load(graph)
+        finally:
+            # Otherwise the journal would grow until the next reconcile.
+            self.family.end_reconcile()
+        self.directory.load(users)
+        await self.reconcile_profiles(users)
+
+    async def reconcile_profiles(self, users: list[User]):
+        """Queue updates for guild members whose Cupid profile is outdated.
+
+        Members who haven't registered are skipped, and will be registered
+        when they first use a command.
+        """
+        guild = self.bot.get_guild(self.id)
+        if not guild:
+            return
+        profiles = {user.id: profile_fields(user) for user in users}
+        outdated = 0
+        async for member in self.bot.all_members(guild):
+            profile = profiles.get(member.id)
+            if profile and profile != profile_fields(member):
+                self.bot.profile_sync.push(self.id, member)
+                outdated += 1
+        logger.info(
+            'Queued %d outdated profiles in %s to be synced.',
+            outdated, self.config.name,
+        )
+
+    async def maintain_family(self):
+        """Periodically reconcile the local indexes."""
+        while True:
+            await asyncio.sleep(CONFIG.family_reconcile_interval)
+            try:
+                await self.refresh_indexes()
+            except Exception:
+                logger.exception('Failed to refresh the local indexes.')
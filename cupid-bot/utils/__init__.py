@@ -6,6 +6,7 @@ from discord.ext import commands
 if typing.TYPE_CHECKING:
     from .converters import CupidUser
     from ..bot import CupidBot
+    from ..guilds import GuildState
 
 
 class Context(commands.Context):
@@ -15,4 +16,6 @@ class Context(commands.Context):
     """
 
     bot: 'CupidBot'
+    guild_state: 'GuildState'
     cupid_user: 'CupidUser'
+    started_at: float
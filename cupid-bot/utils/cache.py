@@ -0,0 +1,122 @@
+"""In-memory caches for API data."""
+import asyncio
+import collections
+import time
+from typing import (
+    Awaitable,
+    Callable,
+    Generic,
+    Hashable,
+    Iterator,
+    Optional,
+    TypeVar,
+)
+
+
+K = TypeVar('K', bound=Hashable)
+V = TypeVar('V')
+
+
+class LRUCache(Generic[K, V]):
+    """A bounded mapping with least-recently-used eviction.
+
+    Entries can optionally expire a fixed number of seconds after they are
+    stored.
+    """
+
+    def __init__(self, maxsize: int, ttl: Optional[float] = None):
+        """Set up the cache."""
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: collections.OrderedDict[K, tuple[float, V]] = (
+            collections.OrderedDict()
+        )
+
+    def __len__(self) -> int:
+        """Get the number of entries in the cache, including expired ones."""
+        return len(self._data)
+
+    def __contains__(self, key: K) -> bool:
+        """Check if an unexpired entry exists, without marking it as used."""
+        try:
+            expires, _value = self._data[key]
+        except KeyError:
+            return False
+        return expires > time.monotonic()
+
+    def __iter__(self) -> Iterator[K]:
+        """Iterate over the keys in the cache, least recently used first."""
+        return iter(list(self._data))
+
+    def get(self, key: K, default: Optional[V] = None) -> Optional[V]:
+        """Get an entry from the cache and mark it as recently used."""
+        try:
+            expires, value = self._data[key]
+        except KeyError:
+            return default
+        if expires <= time.monotonic():
+            del self._data[key]
+            return default
+        self._data.move_to_end(key)
+        return value
+
+    def peek(self, key: K, default: Optional[V] = None) -> Optional[V]:
+        """Get an entry without marking it as recently used."""
+        try:
+            expires, value = self._data[key]
+        except KeyError:
+            return default
+        return value if expires > time.monotonic() else default
+
+    def set(self, key: K, value: V):
+        """Store an entry, evicting the least recently used if needed."""
+        expires = time.monotonic() + self.ttl if self.ttl else float('inf')
+        self._data[key] = (expires, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key: K, default: Optional[V] = None) -> Optional[V]:
+        """Remove an entry from the cache and return it."""
+        try:
+            expires, value = self._data.pop(key)
+        except KeyError:
+            return default
+        return value if expires > time.monotonic() else default
+
+    def clear(self):
+        """Remove every entry from the cache."""
+        self._data.clear()
+
+
+class SingleFlight(Generic[K, V]):
+    """De-duplicates concurrent calls for the same key.
+
+    While a call for a key is in flight, any other calls for that key wait
+    for and share its result instead of starting their own.
+    """
+
+    def __init__(self):
+        """Set up the table of in-flight calls."""
+        self._calls: dict[K, asyncio.Future[V]] = {}
+        self.calls = 0
+        self.shared = 0
+
+    @property
+    def hit_rate(self) -> float:
+        """Get the proportion of calls which shared an in-flight result."""
+        return self.shared / self.calls if self.calls else 0
+
+    async def do(self, key: K, func: Callable[[], Awaitable[V]]) -> V:
+        """Call a function, unless a call for the same key is in flight."""
+        self.calls += 1
+        future = self._calls.get(key)
+        if future is not None:
+            self.shared += 1
+        else:
+            future = asyncio.ensure_future(func())
+            self._calls[key] = future
+            future.add_done_callback(lambda _: self._calls.pop(key, None))
+        # Shield the call so one caller being cancelled doesn't cancel it for
+        # everyone else waiting on it.
+        return await asyncio.shield(future)
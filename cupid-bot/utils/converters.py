@@ -6,11 +6,34 @@ import cupid
 from cupid import Gender
 from cupid.annotations import UserAsAppWithRelationships
 
+import discord
 from discord.ext import commands
 from discord.ext.commands.converter import MemberConverter
 from discord.ext.commands.errors import BadArgument
 
 
+# A user mention or bare user ID.
+MEMBER_ID = re.compile(r'<@!?([0-9]{15,20})>|([0-9]{15,20})')
+
+
+async def resolve_member(
+        ctx: commands.Context, argument: str) -> discord.Member:
+    """Find a member by mention, ID or name.
+
+    Members found by ID are cached, so that they don't need to be fetched
+    again when the guild's member list isn't cached.
+    """
+    match = MEMBER_ID.fullmatch(argument.strip())
+    if match:
+        member_id = int(match.group(1) or match.group(2))
+        member = ctx.guild_state.get_member(member_id)
+        if member:
+            return member
+    member = await MemberConverter().convert(ctx, argument)
+    ctx.guild_state.cache_member(member)
+    return member
+
+
 class CupidUser(UserAsAppWithRelationships):
     """Converter for a Cupid user with relationship data."""
 
@@ -21,12 +44,12 @@ class CupidUser(UserAsAppWithRelationships):
             argument: str) -> UserAsAppWithRelationships:
         """Convert a user to a Cupid user."""
         try:
-            member = await MemberConverter().convert(ctx, argument)
-            return await ctx.bot.get_or_create_user(member)
+            member = await resolve_member(ctx, argument)
+            return await ctx.guild_state.get_or_create_user(member)
         except BadArgument:
             try:
                 id = int(argument.strip())
-                return await ctx.bot.app.get_user(id)
+                return await ctx.guild_state.get_cupid_user(id)
             except (ValueError, cupid.NotFoundError):
                 pass
             raise
@@ -52,3 +75,21 @@ class GenderConverter:
             f'Unkown gender {raw_argument!r}. Should be "non-binary", '
             '"female" or "male".',
         )
+
+
+class TreeOptions(commands.FlagConverter, delimiter='=', prefix=''):
+    """Options for limiting the size of a family tree."""
+
+    depth: Optional[int] = None
+    limit: Optional[int] = None
+
+    @classmethod
+    async def convert(
+            cls, ctx: commands.Context, argument: str) -> 'TreeOptions':
+        """Parse the options, checking that they are at least 1."""
+        options = await super().convert(ctx, argument)
+        for name in ('depth', 'limit'):
+            value = getattr(options, name)
+            if value is not None and value < 1:
+                raise BadArgument(f'The {name} must be at least 1.')
+        return options
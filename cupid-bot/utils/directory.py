@@ -0,0 +1,194 @@
+"""A compact local directory of users, with fuzzy name search."""
+import array
+import bisect
+import collections
+import math
+from typing import Iterable, NamedTuple
+
+from cupid import Gender
+from cupid.annotations import User
+
+
+# How many users to show per page of search results.
+PAGE_SIZE = 20
+
+# The proportion of a search's trigrams a name must share to match it.
+TRIGRAM_THRESHOLD = 0.5
+
+# Sorts after any name starting with the same prefix.
+PREFIX_END = chr(0x10ffff)
+
+GENDERS = list(Gender)
+
+
+def normalise(name: str) -> str:
+    """Normalise a name for searching."""
+    return name.casefold().strip()
+
+
+def trigrams(name: str) -> set[str]:
+    """Get the set of three letter sequences in a normalised name."""
+    return {name[index:index + 3] for index in range(len(name) - 2)}
+
+
+class DirectoryEntry(NamedTuple):
+    """A user in the directory."""
+
+    id: int
+    name: str
+    gender: Gender
+
+
+class DirectorySearch:
+    """The paginated results of a directory search.
+
+    Prefix matches are a window over the directory's sorted names rather
+    than a copy, since an empty search matches everyone.
+    """
+
+    def __init__(
+            self,
+            directory: 'UserDirectory',
+            prefixed: range,
+            fuzzy: array.array):
+        """Store the results."""
+        self.directory = directory
+        self.sorted_names = directory.sorted_names
+        self.prefixed = prefixed
+        self.fuzzy = fuzzy
+        self.total_pages = math.ceil(len(self) / PAGE_SIZE)
+
+    def __len__(self) -> int:
+        """Get the number of results."""
+        return len(self.prefixed) + len(self.fuzzy)
+
+    def page(self, number: int) -> list[DirectoryEntry]:
+        """Get a page of results."""
+        start = number * PAGE_SIZE
+        stop = start + PAGE_SIZE
+        window = self.prefixed[start:stop]
+        slots = [
+            slot
+            for _name, slot in self.sorted_names[window.start:window.stop]
+        ]
+        offset = len(self.prefixed)
+        slots.extend(self.fuzzy[max(start - offset, 0):max(stop - offset, 0)])
+        return list(map(self.directory.entry, slots))
+
+    async def get_page(self, number: int) -> list[DirectoryEntry]:
+        """Get a page of results, in the same way as the API's paginators."""
+        return self.page(number)
+
+
+class UserDirectory:
+    """A directory of users' IDs, names and genders.
+
+    Users are stored in parallel arrays, and indexed by sorted name (for
+    prefix searches) and by trigram (for fuzzy searches).
+    """
+
+    def __init__(self):
+        """Set up the empty directory."""
+        self.ids = array.array('Q')
+        self.names: list[str] = []
+        self.genders = bytearray()
+        self.slots: dict[int, int] = {}
+        self.sorted_names: list[tuple[str, int]] = []
+        self.trigrams: dict[str, array.array] = {}
+        self.ready = False
+
+    def __len__(self) -> int:
+        """Get the number of users in the directory."""
+        return len(self.names)
+
+    def __contains__(self, user_id: int) -> bool:
+        """Check if a user is in the directory."""
+        return user_id in self.slots
+
+    def load(self, users: Iterable[User]):
+        """Replace the directory with a full list of users."""
+        self.ids = array.array('Q')
+        self.names = []
+        self.genders = bytearray()
+        self.slots = {}
+        self.trigrams = {}
+        for user in users:
+            if user.id in self.slots:
+                continue
+            self.slots[user.id] = len(self.names)
+            self.ids.append(user.id)
+            self.names.append(user.name)
+            self.genders.append(GENDERS.index(user.gender))
+        self.sorted_names = sorted(
+            (normalise(name), slot) for slot, name in enumerate(self.names)
+        )
+        for slot, name in enumerate(self.names):
+            self._index_trigrams(slot, name)
+        self.ready = True
+
+    def add(self, user: User):
+        """Add or update a user."""
+        slot = self.slots.get(user.id)
+        if slot is None:
+            slot = self.slots[user.id] = len(self.names)
+            self.ids.append(user.id)
+            self.names.append(user.name)
+            self.genders.append(GENDERS.index(user.gender))
+        else:
+            self.genders[slot] = GENDERS.index(user.gender)
+            if self.names[slot] == user.name:
+                return
+            self._unindex(slot)
+            self.names[slot] = user.name
+        bisect.insort(self.sorted_names, (normalise(user.name), slot))
+        self._index_trigrams(slot, user.name)
+
+    def entry(self, slot: int) -> DirectoryEntry:
+        """Get the user stored in a slot."""
+        return DirectoryEntry(
+            id=self.ids[slot],
+            name=self.names[slot],
+            gender=GENDERS[self.genders[slot]],
+        )
+
+    def search(self, query: str = '') -> DirectorySearch:
+        """Search for users by name.
+
+        Names starting with the query come first, in alphabetical order,
+        followed by names sharing enough trigrams with it, best match first.
+        """
+        query = normalise(query)
+        prefixed = range(
+            bisect.bisect_left(self.sorted_names, (query, -1)),
+            bisect.bisect_left(self.sorted_names, (query + PREFIX_END, -1)),
+        )
+        fuzzy = array.array('I')
+        query_trigrams = trigrams(query)
+        if not query_trigrams:
+            return DirectorySearch(self, prefixed, fuzzy)
+        scores: collections.Counter[int] = collections.Counter()
+        for trigram in query_trigrams:
+            scores.update(self.trigrams.get(trigram, ()))
+        threshold = len(query_trigrams) * TRIGRAM_THRESHOLD
+        fuzzy.extend(sorted(
+            (
+                slot for slot, score in scores.items()
+                if score >= threshold
+                and not normalise(self.names[slot]).startswith(query)
+            ),
+            key=lambda slot: (-scores[slot], normalise(self.names[slot])),
+        ))
+        return DirectorySearch(self, prefixed, fuzzy)
+
+    def _index_trigrams(self, slot: int, name: str):
+        """Add a user's name to the trigram index."""
+        for trigram in trigrams(normalise(name)):
+            self.trigrams.setdefault(trigram, array.array('I')).append(slot)
+
+    def _unindex(self, slot: int):
+        """Remove a user's current name from the indexes."""
+        name = normalise(self.names[slot])
+        index = bisect.bisect_left(self.sorted_names, (name, slot))
+        del self.sorted_names[index]
+        for trigram in trigrams(name):
+            self.trigrams[trigram].remove(slot)
@@ -22,6 +22,10 @@ async def on_command_error(ctx: commands.Context, error: Exception):
     if hasattr(error, 'original') and isinstance(error.original, CupidError):
         await on_cupid_error(ctx, error.original)
         return
+    if isinstance(getattr(error, 'original', None), commands.CommandError):
+        # Raised deliberately by the command rather than a bug, so reported
+        # the same way as errors from checks and converters.
+        error = error.original
     raw_title = type(error).__name__
     raw_title = re.sub('([a-z])([A-Z])', r'\1 \2', raw_title)
     title = raw_title[0].upper() + raw_title[1:].lower()
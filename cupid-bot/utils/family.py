@@ -0,0 +1,180 @@
+"""A local index of the family graph, kept up to date from bot events."""
+import collections
+import dataclasses
+from typing import Iterable, Optional
+
+from cupid.annotations import Graph, Relationship, User
+
+
+Pair = tuple[int, int]
+
+
+def _pair(relationship: Relationship) -> Pair:
+    """Get a key for the pair of users in a relationship."""
+    a, b = relationship.initiator.id, relationship.other.id
+    return (a, b) if a < b else (b, a)
+
+
+@dataclasses.dataclass
+class FamilyGraph:
+    """Part of the family graph, in the same shape as the API's graphs."""
+
+    users: dict[int, User]
+    relationships: list[Relationship]
+    # Map of user ID -> number of relatives left out of the graph.
+    hidden: dict[int, int] = dataclasses.field(default_factory=dict)
+    # Number of people left out of the graph entirely.
+    omitted: int = 0
+
+
+class FamilyIndex:
+    """An adjacency index of users and their relationships.
+
+    The index is seeded from a full graph, then updated incrementally as
+    relationships are created, accepted and removed. While it is being
+    reconciled against a fresh graph, changes are journaled so that they
+    can be replayed on top of the (possibly already outdated) new graph.
+    """
+
+    def __init__(self):
+        """Set up an empty index."""
+        self.users: dict[int, User] = {}
+        self.relationships: dict[Pair, Relationship] = {}
+        self.adjacency: dict[int, set[Pair]] = collections.defaultdict(set)
+        self.ready = False
+        self._journal: Optional[list[tuple[bool, Relationship]]] = None
+
+    @classmethod
+    def from_graph(cls, data: Graph) -> 'FamilyIndex':
+        """Create an index from a graph fetched from the API."""
+        index = cls()
+        index.load(data)
+        return index
+
+    def begin_reconcile(self):
+        """Start journaling changes, ready to load a fresh graph."""
+        self._journal = []
+
+    def end_reconcile(self):
+        """Stop journaling changes, eg. if the fresh graph can't be fetched.
+
+        Changes are applied to the index as well as journaled, so it is still
+        up to date.
+        """
+        self._journal = None
+
+    def load(self, data: Graph):
+        """Replace the index with a graph fetched from the API."""
+        journal, self._journal = self._journal or [], None
+        self.users = dict(data.users)
+        self.relationships.clear()
+        self.adjacency.clear()
+        for relationship in data.relationships:
+            self.add(relationship)
+        for removed, relationship in journal:
+            if removed:
+                self.remove(relationship)
+            else:
+                self.add(relationship)
+        self.ready = True
+
+    def add_user(self, user: User):
+        """Add or update a user."""
+        self.users[user.id] = user
+
+    def add(self, relationship: Relationship):
+        """Add or update a relationship."""
+        if self._journal is not None:
+            self._journal.append((False, relationship))
+        for user in (relationship.initiator, relationship.other):
+            self.users.setdefault(user.id, user)
+        key = _pair(relationship)
+        self.relationships[key] = relationship
+        for user_id in key:
+            self.adjacency[user_id].add(key)
+
+    def remove(self, relationship: Relationship):
+        """Remove a relationship, if it exists."""
+        if self._journal is not None:
+            self._journal.append((True, relationship))
+        key = _pair(relationship)
+        self.relationships.pop(key, None)
+        for user_id in key:
+            self.adjacency[user_id].discard(key)
+
+    def neighbours(self, user_id: int) -> Iterable[tuple[int, Pair]]:
+        """Get the users someone is in an accepted relationship with."""
+        for key in self.adjacency.get(user_id, ()):
+            if self.relationships[key].accepted:
+                yield (key[1] if key[0] == user_id else key[0]), key
+
+    def component(
+            self,
+            user: User,
+            depth: Optional[int] = None,
+            limit: Optional[int] = None) -> FamilyGraph:
+        """Get everyone related (even indirectly) to a user.
+
+        Optionally, only include people within a number of relationships of
+        the user, and/or a maximum number of people.
+        """
+        self.users.setdefault(user.id, user)
+        return self._walk([user.id], depth, limit)
+
+    def graph(self, limit: Optional[int] = None) -> FamilyGraph:
+        """Get the entire graph, optionally with a maximum number of people.
+
+        If there is a limit, whole families are included where possible.
+        """
+        if limit is None:
+            return FamilyGraph(
+                users=dict(self.users),
+                relationships=[
+                    relationship
+                    for relationship in self.relationships.values()
+                    if relationship.accepted
+                ],
+            )
+        graph = self._walk(sorted(self.users), None, limit)
+        graph.omitted = len(self.users) - len(graph.users)
+        return graph
+
+    def _walk(
+            self,
+            roots: Iterable[int],
+            depth: Optional[int],
+            limit: Optional[int]) -> FamilyGraph:
+        """Breadth-first search from some users, stopping at the bounds."""
+        seen: set[int] = set()
+        edges: set[Pair] = set()
+        queue: collections.deque[tuple[int, int]] = collections.deque()
+        for root in roots:
+            if limit is not None and len(seen) >= limit:
+                break
+            if root in seen:
+                continue
+            seen.add(root)
+            queue.append((root, 0))
+            while queue:
+                current, distance = queue.popleft()
+                for other, key in self.neighbours(current):
+                    if other in seen:
+                        edges.add(key)
+                    elif (
+                            (depth is None or distance < depth)
+                            and (limit is None or len(seen) < limit)):
+                        seen.add(other)
+                        edges.add(key)
+                        queue.append((other, distance + 1))
+        hidden = {}
+        for user_id in seen:
+            count = sum(
+                other not in seen for other, _key in self.neighbours(user_id)
+            )
+            if count:
+                hidden[user_id] = count
+        return FamilyGraph(
+            users={user_id: self.users[user_id] for user_id in seen},
+            relationships=[self.relationships[key] for key in edges],
+            hidden=hidden,
+        )
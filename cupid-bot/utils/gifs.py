@@ -1,41 +1,118 @@
 """Tool to get GIFs from the tenor API."""
+import asyncio
 import base64
+import collections
+import logging
 import random
+from typing import Any, Optional
 
-from cupid import Cupid, RelationshipKind
-from cupid.annotations import Relationship
+from cupid import RelationshipKind
 
-from ..config import CONFIG
+import discord
 
+from .http import HttpClient
+from .metrics import TENOR_SECONDS
+from ..config import BUNDLED_GIF, BUNDLED_GIF_URL, CONFIG
+
+
+logger = logging.getLogger(__name__)
 
 TENOR_API = 'https://g.tenor.com/v1'
 
+# The most results Tenor will return for one request.
+MAX_BATCH = 50
 
-async def get_gif(cupid: Cupid, search: str) -> str:
-    """Get the URL to a GIF.
+PROPOSAL_TERMS = {
+    RelationshipKind.MARRIAGE: 'proposal cute',
+    RelationshipKind.ADOPTION: 'hug child',
+}
 
-    Uses the AIOHTTP session instance from Cupid client.
-    """
-    session = await cupid._get_client()  # noqa: SF01
+
+async def get_gifs(http: HttpClient, search: str, limit: int) -> list[str]:
+    """Get the URLs to a batch of random GIFs."""
     params = {
         'q': search,
         'contentfilter': 'low',
-        'limit': 1,
+        'limit': min(limit, MAX_BATCH),
         'key': CONFIG.tenor_token,
         # The endpoint always returns the same result if we don't do this,
         # because Tenor seems to seed the RNG on the request. This parameter
         # is not documented, but we just need to change the request each time.
         'rngseed': base64.b64encode(random.randbytes(64)).decode('utf-8'),
     }
-    async with session.get(f'{TENOR_API}/random', params=params) as resp:
-        data = await resp.json()
-        return data['results'][0]['media'][0]['gif']['url']
-
-
-async def proposal_gif(cupid: Cupid, relationship: Relationship) -> str:
-    """Get the URL to a GIF to accompany a proposal."""
-    if relationship.kind == RelationshipKind.MARRIAGE:
-        term = 'proposal cute'
-    else:
-        term = 'hug child'
-    return await get_gif(cupid, term)
+    with TENOR_SECONDS.time():
+        url = f'{TENOR_API}/random'
+        async with http.session.get(url, params=params) as resp:
+            data = await resp.json()
+    return [result['media'][0]['gif']['url'] for result in data['results']]
+
+
+async def get_gif(http: HttpClient, search: str) -> str:
+    """Get the URL to a GIF."""
+    return (await get_gifs(http, search, 1))[0]
+
+
+def gif_attachment(url: Optional[str]) -> dict[str, Any]:
+    """Get the arguments to attach a GIF to a message, if it needs attaching.
+
+    Only the bundled GIF is attached, others are linked to.
+    """
+    if url == BUNDLED_GIF_URL:
+        return {'file': discord.File(BUNDLED_GIF)}
+    return {}
+
+
+class GifPool:
+    """A pool of GIF URLs for each search term, refilled in the background.
+
+    When a pool drops below the low watermark, it is topped up to the high
+    watermark with a single request.
+    """
+
+    def __init__(self, http: HttpClient, low: int, high: int):
+        """Set up the empty pools."""
+        self.http = http
+        self.low = low
+        self.high = high
+        self._pools: dict[str, collections.deque[str]] = (
+            collections.defaultdict(collections.deque)
+        )
+        self._refills: dict[str, asyncio.Task] = {}
+        self._last: dict[str, str] = {}
+
+    def pop(self, search: str) -> str:
+        """Get a GIF from the pool without waiting.
+
+        If the pool is empty, the last GIF given out for the same search is
+        reused, or failing that, the fallback (by default, the bundled GIF).
+        """
+        pool = self._pools[search]
+        if pool:
+            self._last[search] = pool.popleft()
+        if len(pool) < self.low:
+            self.refill(search)
+        return self._last.get(search, CONFIG.fallback_gif_url)
+
+    async def get(self, search: str) -> str:
+        """Get a GIF, waiting for the pool to be refilled if it's empty."""
+        if not self._pools[search]:
+            await asyncio.shield(self.refill(search))
+        return self.pop(search)
+
+    def refill(self, search: str) -> asyncio.Task:
+        """Start topping up a pool, unless that is already in progress."""
+        task = self._refills.get(search)
+        if not task or task.done():
+            task = asyncio.create_task(self._refill(search))
+            self._refills[search] = task
+        return task
+
+    async def _refill(self, search: str):
+        """Top up a pool to the high watermark."""
+        pool = self._pools[search]
+        try:
+            pool.extend(await get_gifs(
+                self.http, search, self.high - len(pool),
+            ))
+        except Exception:
+            logger.exception('Failed to fetch GIFs for %r.', search)
@@ -1,12 +1,34 @@
 """Tool for drawing the family tree."""
+import asyncio
 import collections
+import concurrent.futures
 import io
+import subprocess
+import time
+from typing import Optional, Union
 
 from cupid import RelationshipKind
 from cupid.annotations import Graph, Relationship, User
 
+from discord.ext import commands
+
 import graphviz
 
+from .family import FamilyGraph
+from .metrics import (
+    RENDERS_REJECTED,
+    RENDER_QUEUE_SECONDS,
+    RENDER_SECONDS,
+)
+
+
+class RendererBusy(commands.CommandError):
+    """Raised when too many graphs are already waiting to be rendered."""
+
+
+class RenderTimedOut(commands.CommandError):
+    """Raised when a graph takes too long to render."""
+
 
 def plot_nodes(graph: graphviz.Graph, users: dict[int, User]):
     """Add a node for each user on the graph."""
@@ -14,19 +36,79 @@ def plot_nodes(graph: graphviz.Graph, users: dict[int, User]):
         graph.node(str(user.id), user.name)
 
 
-def force_same_rank(graph: graphviz.Graph, *users: User):
+def plot_hidden(graph: graphviz.Graph, hidden: dict[int, int]):
+    """Add a stub node for relatives left out of the graph."""
+    for user_id, count in hidden.items():
+        graph.node(
+            f'hidden-{user_id}', f'+{count} more', fontcolor='#b9bbbe',
+        )
+        graph.edge(
+            str(user_id), f'hidden-{user_id}', color='#72767d', style='dashed',
+        )
+
+
+def force_same_rank(graph: graphviz.Graph, *user_ids: int):
     """Ensure each of given user is displayed in the same vertical position."""
     subgraph = graphviz.Graph()
     subgraph.attr(rank='same')
-    for user in users:
-        subgraph.node(str(user.id))
+    for user_id in user_ids:
+        subgraph.node(str(user_id))
     graph.subgraph(subgraph)
 
 
+class DisjointSet:
+    """A union-find structure over user IDs."""
+
+    def __init__(self):
+        """Set up an empty set of sets."""
+        self.parents: dict[int, int] = {}
+
+    def find(self, item: int) -> int:
+        """Get the representative of the set an item is in."""
+        self.parents.setdefault(item, item)
+        while self.parents[item] != item:
+            # Path halving keeps the trees shallow.
+            self.parents[item] = self.parents[self.parents[item]]
+            item = self.parents[item]
+        return item
+
+    def union(self, a: int, b: int):
+        """Merge the sets two items are in."""
+        root_a, root_b = self.find(a), self.find(b)
+        if root_a != root_b:
+            self.parents[root_b] = root_a
+
+    def groups(self) -> list[list[int]]:
+        """Get every set with more than one item in it."""
+        groups: dict[int, list[int]] = collections.defaultdict(list)
+        for item in self.parents:
+            groups[self.find(item)].append(item)
+        return [sorted(group) for group in groups.values() if len(group) > 1]
+
+
+def rank_groups(relationships: list[Relationship]) -> list[list[int]]:
+    """Group users who should be displayed in the same vertical position.
+
+    Spouses and siblings are merged into overlapping groups, so that (for
+    example) someone married into two sets of siblings results in one rank
+    constraint rather than three competing ones.
+    """
+    ranks = DisjointSet()
+    # Map of parent ID -> ID of one of their children.
+    first_child: dict[int, int] = {}
+    for relationship in relationships:
+        if relationship.kind == RelationshipKind.MARRIAGE:
+            ranks.union(relationship.initiator.id, relationship.other.id)
+        else:
+            sibling = first_child.setdefault(
+                relationship.initiator.id, relationship.other.id,
+            )
+            ranks.union(sibling, relationship.other.id)
+    return ranks.groups()
+
+
 def plot_edges(graph: graphviz.Graph, relationships: list[Relationship]):
     """Add an edge between each related user to the graph."""
-    # Map of parent ID -> children.
-    siblings: dict[int, list[User]] = collections.defaultdict(list)
     for relationship in relationships:
         colour = (
             '#eb459e' if relationship.kind == RelationshipKind.MARRIAGE
@@ -37,16 +119,12 @@ def plot_edges(graph: graphviz.Graph, relationships: list[Relationship]):
             str(relationship.other.id),
             color=colour,
         )
-        if relationship.kind == RelationshipKind.MARRIAGE:
-            force_same_rank(graph, relationship.initiator, relationship.other)
-        else:
-            siblings[relationship.initiator.id].append(relationship.other)
-    for children in siblings.values():
-        force_same_rank(graph, *children)
+    for group in rank_groups(relationships):
+        force_same_rank(graph, *group)
 
 
-def render_graph(data: Graph) -> io.BytesIO:
-    """Draws the graph."""
+def build_graph(data: Union[Graph, FamilyGraph]) -> graphviz.Graph:
+    """Build the Graphviz source for a graph."""
     graph = graphviz.Graph(
         graph_attr={'bgcolor': '#36393f', 'splines': 'ortho'},
         node_attr={
@@ -58,6 +136,92 @@ def render_graph(data: Graph) -> io.BytesIO:
     )
     plot_nodes(graph, data.users)
     plot_edges(graph, data.relationships)
-    stream = io.BytesIO(graph.pipe(format='png'))
+    if isinstance(data, FamilyGraph):
+        plot_hidden(graph, data.hidden)
+        if data.omitted:
+            graph.attr(
+                label=f'+{data.omitted} more people not shown',
+                fontcolor='#b9bbbe',
+            )
+    return graph
+
+
+def render_graph(
+        data: Union[Graph, FamilyGraph],
+        timeout: Optional[float] = None) -> io.BytesIO:
+    """Draws the graph.
+
+    This blocks until Graphviz is finished, so should be run in an executor.
+    """
+    graph = build_graph(data)
+    # Graphviz's own pipe method doesn't support a timeout.
+    result = subprocess.run(
+        [graph.engine, '-Tpng'],
+        input=graph.source.encode('utf-8'),
+        capture_output=True,
+        timeout=timeout,
+        check=True,
+    )
+    stream = io.BytesIO(result.stdout)
     stream.seek(0)
     return stream
+
+
+class GraphRenderer:
+    """Renders graphs in a pool of worker threads, off the event loop."""
+
+    def __init__(self, workers: int, timeout: float, max_queue: int):
+        """Set up the worker pool."""
+        self.executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix='render',
+        )
+        self.timeout = timeout
+        self.max_queue = max_queue
+        self.pending = 0
+
+    async def render(self, data: Union[Graph, FamilyGraph]) -> io.BytesIO:
+        """Draw a graph, or raise an error if the renderer is overloaded."""
+        if self.pending >= self.max_queue:
+            RENDERS_REJECTED.inc()
+            raise RendererBusy(
+                'Too many family trees are being drawn right now, please try '
+                'again in a moment.',
+            )
+        self.pending += 1
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(
+                self.executor,
+                self._timed_render, data, loop, time.perf_counter(),
+            )
+        except subprocess.TimeoutExpired:
+            raise RenderTimedOut(
+                'That family tree is too big to draw in time.',
+            ) from None
+        finally:
+            self.pending -= 1
+
+    def _timed_render(
+            self,
+            data: Union[Graph, FamilyGraph],
+            loop: asyncio.AbstractEventLoop,
+            queued_at: float) -> io.BytesIO:
+        """Draw a graph in a worker, timing the wait and the drawing.
+
+        The timings are recorded from the event loop, since the metrics
+        aren't thread-safe.
+        """
+        started_at = time.perf_counter()
+        loop.call_soon_threadsafe(
+            RENDER_QUEUE_SECONDS.observe, started_at - queued_at,
+        )
+        try:
+            return render_graph(data, self.timeout)
+        finally:
+            loop.call_soon_threadsafe(
+                RENDER_SECONDS.observe, time.perf_counter() - started_at,
+            )
+
+    def close(self):
+        """Stop the worker pool, abandoning any queued renders."""
+        self.executor.shutdown(wait=False, cancel_futures=True)
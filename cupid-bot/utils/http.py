@@ -0,0 +1,50 @@
+"""HTTP client for third-party services (other than the Cupid API)."""
+from typing import Optional
+
+import aiohttp
+
+
+class HttpClient:
+    """An HTTP session with its own connection pool and strict timeouts.
+
+    This is kept separate from the Cupid API client's session so that a slow
+    third-party service can't use up the connections or time the Cupid API
+    needs.
+    """
+
+    def __init__(
+            self,
+            pool_size: int,
+            keepalive: float,
+            dns_ttl: int,
+            connect_timeout: float,
+            read_timeout: float):
+        """Store the session settings."""
+        self.pool_size = pool_size
+        self.keepalive = keepalive
+        self.dns_ttl = dns_ttl
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.session: Optional[aiohttp.ClientSession] = None
+
+    def open(self):
+        """Create the session. This must be called from the event loop."""
+        connector = aiohttp.TCPConnector(
+            limit=self.pool_size,
+            keepalive_timeout=self.keepalive,
+            use_dns_cache=True,
+            ttl_dns_cache=self.dns_ttl,
+        )
+        timeout = aiohttp.ClientTimeout(
+            sock_connect=self.connect_timeout,
+            sock_read=self.read_timeout,
+        )
+        self.session = aiohttp.ClientSession(
+            connector=connector, timeout=timeout, raise_for_status=True,
+        )
+
+    async def close(self):
+        """Close the session and its connections."""
+        if self.session:
+            await self.session.close()
+            self.session = None
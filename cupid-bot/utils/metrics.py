@@ -0,0 +1,251 @@
+"""Counters and latency histograms, with Prometheus text exposition."""
+import asyncio
+import bisect
+import contextlib
+import math
+import time
+from typing import Callable, Iterator, Optional, TypeVar, Union
+
+
+DEFAULT_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60,
+)
+
+Labels = tuple[tuple[str, str], ...]
+
+
+def _labels(labels: dict[str, str]) -> Labels:
+    """Get a hashable, ordered version of a set of labels."""
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _format_labels(labels: Labels, **extra: str) -> str:
+    """Format labels for the Prometheus text format."""
+    pairs = list(labels) + list(extra.items())
+    if not pairs:
+        return ''
+    inner = ','.join(f'{key}="{_escape(value)}"' for key, value in pairs)
+    return f'{{{inner}}}'
+
+
+def _escape(value: str) -> str:
+    """Escape a label value for the Prometheus text format."""
+    return (
+        value.replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+    )
+
+
+def _format_number(value: float) -> str:
+    """Format a number for the Prometheus text format."""
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value))
+
+
+class Counter:
+    """A count of events, split by labels."""
+
+    kind = 'counter'
+
+    def __init__(self, name: str, description: str):
+        """Set up the counter."""
+        self.name = name
+        self.description = description
+        self.values: dict[Labels, float] = {}
+
+    def inc(self, amount: float = 1, **labels: str):
+        """Increase the count."""
+        key = _labels(labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def total(self) -> float:
+        """Get the count across all labels."""
+        return sum(self.values.values())
+
+    def expose(self) -> Iterator[str]:
+        """Get lines of the Prometheus text format."""
+        for labels, value in sorted(self.values.items()):
+            formatted = _format_labels(labels)
+            yield f'{self.name}{formatted} {_format_number(value)}'
+
+
+class Histogram:
+    """A distribution of observed durations, split by labels."""
+
+    kind = 'histogram'
+
+    def __init__(
+            self,
+            name: str,
+            description: str,
+            buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        """Set up the histogram."""
+        self.name = name
+        self.description = description
+        self.buckets = tuple(buckets) + (math.inf,)
+        self.counts: dict[Labels, list[int]] = {}
+        self.sums: dict[Labels, float] = {}
+
+    def observe(self, value: float, **labels: str):
+        """Record a value."""
+        key = _labels(labels)
+        if key not in self.counts:
+            self.counts[key] = [0] * len(self.buckets)
+            self.sums[key] = 0
+        self.counts[key][bisect.bisect_left(self.buckets, value)] += 1
+        self.sums[key] += value
+
+    @contextlib.contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        """Record how long a block of code takes."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels: str) -> int:
+        """Get the number of values recorded with some labels."""
+        return sum(self.counts.get(_labels(labels), ()))
+
+    def quantile(self, quantile: float, **labels: str) -> Optional[float]:
+        """Estimate a quantile by interpolating within its bucket.
+
+        Returns None if nothing has been recorded with the labels.
+        """
+        counts = self.counts.get(_labels(labels), ())
+        rank = quantile * sum(counts)
+        seen = 0
+        for index, count in enumerate(counts):
+            if count and seen + count >= rank:
+                lower = self.buckets[index - 1] if index else 0
+                upper = self.buckets[index]
+                if upper == math.inf:
+                    # Nothing is known about values past the last bucket.
+                    upper = lower
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+        return None
+
+    def label_sets(self) -> list[dict[str, str]]:
+        """Get every set of labels which has values recorded."""
+        return [dict(labels) for labels in sorted(self.counts)]
+
+    def expose(self) -> Iterator[str]:
+        """Get lines of the Prometheus text format."""
+        for labels, counts in sorted(self.counts.items()):
+            cumulative = 0
+            for bucket, count in zip(self.buckets, counts):
+                cumulative += count
+                bucket_labels = _format_labels(
+                    labels, le=_format_number(bucket),
+                )
+                yield f'{self.name}_bucket{bucket_labels} {cumulative}'
+            formatted = _format_labels(labels)
+            yield f'{self.name}_sum{formatted} {self.sums[labels]!r}'
+            yield f'{self.name}_count{formatted} {cumulative}'
+
+
+class Gauge:
+    """A value which is read when the metrics are collected."""
+
+    kind = 'gauge'
+
+    def __init__(
+            self, name: str, description: str, read: Callable[[], float]):
+        """Set up the gauge."""
+        self.name = name
+        self.description = description
+        self.read = read
+
+    def expose(self) -> Iterator[str]:
+        """Get lines of the Prometheus text format."""
+        yield f'{self.name} {_format_number(self.read())}'
+
+
+Metric = Union[Counter, Histogram, Gauge]
+M = TypeVar('M', Counter, Histogram, Gauge)
+
+
+class Registry:
+    """A collection of metrics."""
+
+    def __init__(self):
+        """Set up the empty registry."""
+        self.metrics: dict[str, Metric] = {}
+
+    def counter(self, name: str, description: str) -> Counter:
+        """Create and register a counter."""
+        return self._register(Counter(name, description))
+
+    def histogram(self, name: str, description: str) -> Histogram:
+        """Create and register a histogram."""
+        return self._register(Histogram(name, description))
+
+    def gauge(
+            self,
+            name: str,
+            description: str,
+            read: Callable[[], float]) -> Gauge:
+        """Create and register a gauge, replacing any of the same name."""
+        return self._register(Gauge(name, description, read))
+
+    def _register(self, metric: M) -> M:
+        """Add a metric to the registry."""
+        self.metrics[metric.name] = metric
+        return metric
+
+    def expose(self) -> str:
+        """Get all metrics in the Prometheus text format."""
+        lines = []
+        for metric in self.metrics.values():
+            lines.append(f'# HELP {metric.name} {metric.description}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            lines.extend(metric.expose())
+        return '\n'.join(lines) + '\n'
+
+    async def serve(self, host: str, port: int) -> asyncio.AbstractServer:
+        """Serve the metrics over HTTP, for Prometheus to scrape."""
+        async def handle(
+                reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+            """Respond to any request with the metrics."""
+            try:
+                while (await reader.readline()).strip():
+                    pass    # Skip the request line and headers.
+                body = self.expose().encode('utf-8')
+                writer.write(
+                    b'HTTP/1.1 200 OK\r\n'
+                    b'Content-Type: text/plain; version=0.0.4\r\n'
+                    + f'Content-Length: {len(body)}\r\n'.encode('utf-8')
+                    + b'Connection: close\r\n\r\n'
+                    + body,
+                )
+                await writer.drain()
+            finally:
+                writer.close()
+
+        return await asyncio.start_server(handle, host, port)
+
+
+REGISTRY = Registry()
+
+COMMAND_SECONDS = REGISTRY.histogram(
+    'cupid_bot_command_seconds', 'Time taken to run commands.',
+)
+API_CALL_SECONDS = REGISTRY.histogram(
+    'cupid_bot_api_call_seconds', 'Time taken by Cupid API call attempts.',
+)
+TENOR_SECONDS = REGISTRY.histogram(
+    'cupid_bot_tenor_seconds', 'Time taken by Tenor API requests.',
+)
+RENDER_SECONDS = REGISTRY.histogram(
+    'cupid_bot_render_seconds', 'Time taken to draw family trees.',
+)
+RENDER_QUEUE_SECONDS = REGISTRY.histogram(
+    'cupid_bot_render_queue_seconds',
+    'Time family trees waited for a free worker to draw them.',
+)
+RENDERS_REJECTED = REGISTRY.counter(
+    'cupid_bot_renders_rejected_total',
+    'Family trees not drawn because the renderer was busy.',
+)
@@ -1,51 +1,153 @@
 """Discord.py UI view for paginating a list."""
-from typing import Any, Callable, Coroutine, TypeVar
+import asyncio
+import collections
+import dataclasses
+import logging
+from typing import Any, Callable, Coroutine, Generic, Optional, TypeVar
 
-from discord import ButtonStyle, Interaction
+from discord import ButtonStyle, HTTPException, Interaction, Message
 from discord.ext.commands import Context
 from discord.ui import Button, View
 
+from .cache import LRUCache, SingleFlight
+from ..config import CONFIG
+
+
+logger = logging.getLogger(__name__)
+
+# The maximum number of pages each paginator keeps in memory.
+PAGE_CACHE_SIZE = 8
+
+# Paginators which are still accepting button presses, by message ID, least
+# recently used first.
+_live: collections.OrderedDict[int, 'Paginator'] = collections.OrderedDict()
+
+T = TypeVar('T')
+
+
+@dataclasses.dataclass
+class PageSource(Generic[T]):
+    """The pages of a list to paginate."""
+
+    page_count: int
+    get_page: Callable[[int], Coroutine[Any, Any, list[T]]]
+    # Pages which have already been fetched, to be cached.
+    pages: dict[int, list[T]] = dataclasses.field(default_factory=dict)
+
+
+def live_paginators() -> int:
+    """Get the number of paginators still accepting button presses."""
+    return len(_live)
+
 
 class Paginator(View):
-    """View for paginating a list of items."""
+    """View for paginating a list of items.
 
-    T = TypeVar('T')
+    The buttons are disabled after a period of inactivity. There is also a
+    limit on the number of paginators accepting button presses, after which
+    the least recently used have their buttons removed.
+    """
 
     def __init__(
             self,
             ctx: Context,
             title: str,
-            page_count: int,
-            get_page: Callable[[int], Coroutine[Any, Any, list[T]]],
+            source: PageSource[T],
             formatter: Callable[[T], str]):
         """Create a new paginator view."""
-        super().__init__(timeout=None)
+        super().__init__(timeout=CONFIG.paginator_timeout)
         self.back_button = PaginatorButton(delta=-1, label='🠐')
         self.next_button = PaginatorButton(delta=1, label='🠒')
         self.add_item(self.back_button)
         self.add_item(self.next_button)
         self.ctx = ctx
         self.title = title
-        self.page_count = page_count
-        self.get_page = get_page
+        self.page_count = source.page_count
+        self.get_page = source.get_page
         self.formatter = formatter
         self.page = 0
+        self.message: Optional[Message] = None
+        self.pages: LRUCache[int, list] = LRUCache(PAGE_CACHE_SIZE)
+        for number, items in source.pages.items():
+            self.pages.set(number, items)
+        self._fetches: SingleFlight[int, list] = SingleFlight()
+        self._prefetches: set[asyncio.Task] = set()
 
     async def setup(self):
         """Send the view."""
-        await self.ctx.send(content=await self.render(), view=self)
+        self.message = await self.ctx.send(
+            content=await self.render(), view=self,
+        )
+        _live[self.message.id] = self
+        while len(_live) > CONFIG.paginator_max_live:
+            _message_id, oldest = _live.popitem(last=False)
+            await oldest.close()
+
+    def touch(self):
+        """Mark the paginator as recently used."""
+        if self.message and self.message.id in _live:
+            _live.move_to_end(self.message.id)
+
+    async def close(self):
+        """Stop accepting button presses and remove the buttons."""
+        self.stop()
+        for task in self._prefetches:
+            task.cancel()
+        if self.message:
+            _live.pop(self.message.id, None)
+            try:
+                await self.message.edit(view=None)
+            except HTTPException:
+                pass
+
+    async def on_timeout(self):
+        """Disable the buttons once the paginator has been idle a while."""
+        for item in self.children:
+            item.disabled = True
+        if self.message:
+            _live.pop(self.message.id, None)
+            try:
+                await self.message.edit(view=self)
+            except HTTPException:
+                pass
 
     async def render(self) -> str:
         """Render the current page."""
         self.back_button.disabled = self.page <= 0
         self.next_button.disabled = self.page >= self.page_count - 1
-        lines = list(map(self.formatter, await self.get_page(self.page)))
+        lines = list(map(self.formatter, await self.fetch_page(self.page)))
         content = '\n'.join(lines) or "*There's nothing here.*"
+        self.prefetch()
         return (
             f'**{self.title}**\n\n{content}\n\n'
             f'Page {self.page + 1} of {self.page_count or 1}'
         )
 
+    async def fetch_page(self, number: int) -> list[T]:
+        """Get a page, from the cache if possible."""
+        page = self.pages.get(number)
+        if page is None:
+            page = await self._fetches.do(
+                number, lambda: self.get_page(number),
+            )
+            self.pages.set(number, page)
+        return page
+
+    def prefetch(self):
+        """Start fetching the pages either side of the current one."""
+        for number in (self.page - 1, self.page + 1):
+            if 0 <= number < self.page_count and number not in self.pages:
+                task = asyncio.create_task(self._prefetch(number))
+                self._prefetches.add(task)
+                task.add_done_callback(self._prefetches.discard)
+
+    async def _prefetch(self, number: int):
+        """Fetch a page in the background, logging any errors."""
+        try:
+            await self.fetch_page(number)
+        except Exception:
+            logger.exception('Failed to prefetch page %d.', number)
+
 
 class PaginatorButton(Button[Paginator]):
     """A button for moving a paginator forwards or backwards."""
@@ -61,6 +163,7 @@ class PaginatorButton(Button[Paginator]):
         """Handle the button being pressed."""
         if interaction.user.id != self.view.ctx.author.id:
             return
+        self.view.touch()
         self.view.page += self.delta
         if self.view.page < 0:
             self.view.page = 0
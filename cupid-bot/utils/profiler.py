@@ -0,0 +1,186 @@
+"""A sampling profiler for the running bot.
+
+Nothing is sampled unless a profile is running, so there is no overhead
+otherwise.
+"""
+import asyncio
+import collections
+import os
+import sys
+import threading
+import time
+from types import CodeType, FrameType
+from typing import Any, Callable, Optional
+
+
+# Seconds between samples of each thread's stack.
+THREAD_INTERVAL = 0.005
+
+# Seconds between samples of each task's await chain.
+TASK_INTERVAL = 0.02
+
+# Leaf functions which mean a thread is idle rather than doing work, as
+# (file name, function name) pairs.
+IDLE_FUNCTIONS = {
+    ('selectors.py', 'select'),
+    ('threading.py', 'wait'),
+    ('thread.py', '_worker'),
+}
+
+
+def frame_label(code: CodeType) -> str:
+    """Get a label for a function, usable in a collapsed stack."""
+    path = code.co_filename.replace(os.sep, '/').split('/')
+    location = '/'.join(path[-2:])
+    return f'{code.co_name} ({location}:{code.co_firstlineno})'
+
+
+def is_idle(frame: FrameType) -> bool:
+    """Check if a thread's innermost frame means it is waiting for work."""
+    filename = os.path.basename(frame.f_code.co_filename)
+    return (filename, frame.f_code.co_name) in IDLE_FUNCTIONS
+
+
+def thread_stack(frame: Optional[FrameType]) -> list[str]:
+    """Get the labels of a thread's frames, outermost first."""
+    labels = []
+    while frame:
+        labels.append(frame_label(frame.f_code))
+        frame = frame.f_back
+    return labels[::-1]
+
+
+def task_stack(task: asyncio.Task) -> list[str]:
+    """Get the labels of the coroutines a task is awaiting, outermost first.
+
+    The chain ends with whatever the innermost coroutine is waiting on,
+    usually a future.
+    """
+    labels = []
+    awaitable: Any = task.get_coro()
+    while awaitable is not None:
+        code = getattr(awaitable, 'cr_code', None)
+        if code is None:
+            labels.append(f'<{type(awaitable).__name__}>')
+            break
+        labels.append(frame_label(code))
+        awaitable = awaitable.cr_await
+    return labels
+
+
+def leaf(stack: str) -> str:
+    """Get the innermost function in a collapsed stack."""
+    for label in reversed(stack.split(';')):
+        if not label.startswith('<'):
+            return label
+    return stack
+
+
+class Profile:
+    """The results of profiling, as sampled milliseconds per stack."""
+
+    def __init__(self):
+        """Set up the empty results."""
+        self.threads: collections.Counter[str] = collections.Counter()
+        self.tasks: collections.Counter[str] = collections.Counter()
+        self.duration = 0.0
+
+    def collapsed(self) -> str:
+        """Get the stacks in the collapsed format used by flamegraph tools.
+
+        Thread stacks are rooted at "thread <name>", and task await chains
+        at "await".
+        """
+        lines = [
+            f'{stack} {round(weight)}'
+            for counter in (self.threads, self.tasks)
+            for stack, weight in counter.most_common()
+            if round(weight)
+        ]
+        return '\n'.join(lines) + '\n'
+
+    def summary(self, top: int) -> str:
+        """Summarise where the most time was spent."""
+        lines = [f'Profiled for {self.duration:.1f}s.', '']
+        for title, counter in (
+                ('Busy threads (self ms)', self.threads),
+                ('Task waits (ms)', self.tasks)):
+            leaves: collections.Counter[str] = collections.Counter()
+            for stack, weight in counter.items():
+                leaves[leaf(stack)] += weight
+            lines.append(title)
+            for label, weight in leaves.most_common(top):
+                lines.append(f'{weight:9.0f}  {label}')
+            lines.append('')
+        return '\n'.join(lines)
+
+
+class Profiler:
+    """Samples thread stacks and task await chains until stopped.
+
+    Threads are sampled from a separate thread, so CPU-bound work on the
+    event loop is still seen. Tasks are sampled from the event loop, since
+    they can't safely be inspected from elsewhere.
+    """
+
+    def __init__(
+            self, include: Optional[Callable[[asyncio.Task], bool]] = None):
+        """Set up the profiler, optionally only sampling some tasks."""
+        self.include = include
+        self.profile = Profile()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._task: Optional[asyncio.Task] = None
+        self._started_at = 0.0
+
+    def start(self):
+        """Start sampling."""
+        self._started_at = time.perf_counter()
+        self._thread = threading.Thread(
+            target=self._sample_threads, name='profiler', daemon=True,
+        )
+        self._thread.start()
+        self._task = asyncio.create_task(self._sample_tasks())
+
+    async def stop(self) -> Profile:
+        """Stop sampling and get the results."""
+        self._stopped.set()
+        self._task.cancel()
+        await asyncio.get_running_loop().run_in_executor(
+            None, self._thread.join,
+        )
+        self.profile.duration = time.perf_counter() - self._started_at
+        return self.profile
+
+    def _sample_threads(self):
+        """Sample the stack of every other thread, until stopped."""
+        own_id = threading.get_ident()
+        last = time.perf_counter()
+        while not self._stopped.wait(THREAD_INTERVAL):
+            now = time.perf_counter()
+            weight, last = (now - last) * 1000, now
+            names = {
+                thread.ident: thread.name for thread in threading.enumerate()
+            }
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id or is_idle(frame):
+                    continue
+                name = names.get(thread_id, thread_id)
+                stack = ';'.join([f'thread {name}', *thread_stack(frame)])
+                self.profile.threads[stack] += weight
+
+    async def _sample_tasks(self):
+        """Sample the await chain of every other task, until cancelled."""
+        last = time.perf_counter()
+        while True:
+            await asyncio.sleep(TASK_INTERVAL)
+            now = time.perf_counter()
+            weight, last = (now - last) * 1000, now
+            current = asyncio.current_task()
+            for task in asyncio.all_tasks():
+                if task is current:
+                    continue
+                if self.include and not self.include(task):
+                    continue
+                stack = ';'.join(['await', *task_stack(task)])
+                self.profile.tasks[stack] += weight
@@ -0,0 +1,125 @@
+"""Deadlines, retries and a circuit breaker for Cupid API calls."""
+import asyncio
+import random
+import time
+from typing import Awaitable, Callable, Optional, TypeVar
+
+import aiohttp
+
+from cupid import CupidError
+
+from discord.ext import commands
+
+from .metrics import API_CALL_SECONDS
+
+
+T = TypeVar('T')
+
+# Errors which suggest the API is unhealthy, rather than rejecting a request.
+TRANSIENT_ERRORS = (asyncio.TimeoutError, aiohttp.ClientError, OSError)
+
+
+class CupidUnavailable(commands.CommandError):
+    """Raised when the Cupid API isn't responding."""
+
+    def __init__(self):
+        """Set the error message."""
+        super().__init__(
+            "The Cupid API isn't responding right now, please try again in a "
+            'minute.',
+        )
+
+
+class CircuitBreaker:
+    """Fails fast after repeated failures, until a cool-down has passed.
+
+    After the cool-down, calls are let through again. If the next call also
+    fails, the breaker opens again immediately.
+    """
+
+    def __init__(self, threshold: int, reset_after: float):
+        """Set up a closed breaker."""
+        self.threshold = threshold
+        self.reset_after = reset_after
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+
+    @property
+    def is_open(self) -> bool:
+        """Check if calls should currently fail fast."""
+        return (
+            self.opened_at is not None
+            and time.monotonic() - self.opened_at < self.reset_after
+        )
+
+    def record_success(self):
+        """Close the breaker after a successful call."""
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self):
+        """Count a failed call, opening the breaker if there are too many."""
+        self.failures += 1
+        if self.failures >= self.threshold:
+            self.opened_at = time.monotonic()
+
+
+class ResilientCaller:
+    """Makes API calls with a deadline, and retries idempotent ones."""
+
+    def __init__(
+            self,
+            timeout: float,
+            retries: int,
+            backoff: float,
+            breaker: CircuitBreaker):
+        """Store the call settings."""
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.breaker = breaker
+
+    async def read(self, func: Callable[[], Awaitable[T]]) -> T:
+        """Make an idempotent call, retrying transient failures."""
+        return await self._call(func, self.retries, 'read')
+
+    async def write(self, func: Callable[[], Awaitable[T]]) -> T:
+        """Make a call which is not safe to retry."""
+        return await self._call(func, 0, 'write')
+
+    async def _call(
+            self,
+            func: Callable[[], Awaitable[T]],
+            retries: int,
+            kind: str) -> T:
+        """Make a call, retrying with jittered exponential backoff."""
+        for attempt in range(retries + 1):
+            if self.breaker.is_open:
+                API_CALL_SECONDS.observe(0, kind=kind, outcome='short_circuit')
+                raise CupidUnavailable
+            start = time.perf_counter()
+            try:
+                result = await asyncio.wait_for(func(), self.timeout)
+            except CupidError:
+                # The API is working, it just rejected the request.
+                self.breaker.record_success()
+                API_CALL_SECONDS.observe(
+                    time.perf_counter() - start, kind=kind, outcome='rejected',
+                )
+                raise
+            except TRANSIENT_ERRORS as error:
+                self.breaker.record_failure()
+                API_CALL_SECONDS.observe(
+                    time.perf_counter() - start, kind=kind, outcome='failed',
+                )
+                if attempt == retries:
+                    raise CupidUnavailable from error
+                await asyncio.sleep(
+                    random.uniform(0, self.backoff * 2 ** attempt),
+                )
+            else:
+                self.breaker.record_success()
+                API_CALL_SECONDS.observe(
+                    time.perf_counter() - start, kind=kind, outcome='ok',
+                )
+                return result
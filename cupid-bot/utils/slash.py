@@ -0,0 +1,297 @@
+"""Application (slash) commands, as a front end to the prefix commands.
+
+Each application command runs the prefix command of the same name, with
+its options converted to the command's arguments. Users are resolved by
+Discord, so no message content or member lookups are needed.
+"""
+import dataclasses
+import enum
+from typing import Any, Awaitable, Callable, Optional, TYPE_CHECKING
+
+from cupid import NotFoundError
+
+import discord
+from discord.ext import commands
+from discord.ext.commands.view import StringView
+
+from . import Context
+from .converters import GenderConverter, TreeOptions
+
+if TYPE_CHECKING:
+    from ..bot import CupidBot
+
+
+# The longest description Discord allows for a command or option.
+MAX_DESCRIPTION = 100
+
+
+class OptionType(enum.IntEnum):
+    """Types of application command option, as numbered by Discord."""
+
+    STRING = 3
+    INTEGER = 4
+    USER = 6
+
+
+def connection_state(bot: 'CupidBot') -> Any:
+    """Get the bot's connection state.
+
+    Contexts and members need it, but discord.py has no public way to get
+    it.
+    """
+    return bot._connection  # noqa: SF01
+
+
+class InteractionMessage:
+    """Stands in for the message a command context expects."""
+
+    def __init__(self, bot: 'CupidBot', interaction: discord.Interaction):
+        """Copy the relevant details from the interaction."""
+        self._state = connection_state(bot)
+        self.id = interaction.id
+        self.author = interaction.user
+        self.guild = interaction.guild
+        self.channel = interaction.channel
+        self.content = ''
+        self.mentions: list[discord.abc.User] = []
+        self.attachments: list[discord.Attachment] = []
+
+
+class InteractionContext(Context):
+    """Command context for an application command.
+
+    The interaction is deferred before the command runs, so replies are
+    sent as follow-up messages.
+    """
+
+    def __init__(
+            self,
+            bot: 'CupidBot',
+            interaction: discord.Interaction,
+            command: commands.Command):
+        """Set up the context."""
+        super().__init__(
+            message=InteractionMessage(bot, interaction),
+            bot=bot,
+            view=StringView(''),
+            prefix='/',
+            command=command,
+            invoked_with=command.name,
+        )
+        self.interaction = interaction
+
+    async def send(
+            self,
+            content: Optional[str] = None,
+            **kwargs: Any) -> discord.WebhookMessage:
+        """Send a follow-up message."""
+        return await self.interaction.followup.send(
+            content, wait=True, **kwargs,
+        )
+
+
+async def resolve_user(ctx: InteractionContext, value: str) -> Any:
+    """Get the Cupid user for a user option, registering them if needed."""
+    resolved = ctx.interaction.data.get('resolved', {})
+    member_data = resolved.get('members', {}).get(value)
+    user_data = resolved.get('users', {}).get(value)
+    if member_data and user_data:
+        member = discord.Member(
+            data={**member_data, 'user': user_data},
+            guild=ctx.guild,
+            state=connection_state(ctx.bot),
+        )
+        ctx.guild_state.cache_member(member)
+        return await ctx.guild_state.get_or_create_user(member)
+    try:
+        return await ctx.guild_state.get_cupid_user(int(value))
+    except NotFoundError:
+        raise commands.BadArgument(
+            'That user is not in the server, and has not used the bot.',
+        ) from None
+
+
+Converter = Callable[[InteractionContext, Any], Awaitable[Any]]
+
+
+@dataclasses.dataclass
+class Option:
+    """An option of an application command."""
+
+    name: str
+    description: str
+    type: OptionType
+    required: bool = False
+    choices: tuple[str, ...] = ()
+    # The name of the command parameter, if different.
+    param: Optional[str] = None
+    convert: Optional[Converter] = None
+    # Whether this is a flag of the command's flag converter parameter.
+    flag: bool = False
+
+    def payload(self) -> dict[str, Any]:
+        """Get the option as Discord expects it."""
+        payload = {
+            'name': self.name,
+            'description': self.description,
+            'type': self.type.value,
+            'required': self.required,
+        }
+        if self.choices:
+            payload['choices'] = [
+                {'name': choice, 'value': choice} for choice in self.choices
+            ]
+        return payload
+
+
+@dataclasses.dataclass
+class SlashCommand:
+    """The options of an application command."""
+
+    options: list[Option] = dataclasses.field(default_factory=list)
+    # The command parameter flag options are collected into, if any.
+    flags_param: Optional[str] = None
+    flags: Optional[type[commands.FlagConverter]] = None
+
+    def payload(self, command: commands.Command) -> dict[str, Any]:
+        """Get the command as Discord expects it."""
+        return {
+            'name': command.name,
+            'description': command.short_doc[:MAX_DESCRIPTION],
+            'options': [option.payload() for option in self.options],
+        }
+
+    async def arguments(
+            self,
+            ctx: InteractionContext,
+            values: dict[str, Any]) -> dict[str, Any]:
+        """Convert the given option values to the command's arguments."""
+        arguments = {}
+        flags = []
+        for option in self.options:
+            if option.name not in values:
+                continue
+            value = values[option.name]
+            if option.flag:
+                flags.append(f'{option.name}={value}')
+                continue
+            if option.convert:
+                value = await option.convert(ctx, value)
+            arguments[option.param or option.name] = value
+        if flags:
+            arguments[self.flags_param] = await self.flags.convert(
+                ctx, ' '.join(flags),
+            )
+        return arguments
+
+
+GENDERS = ('non-binary', 'female', 'male')
+
+SLASH_COMMANDS = {
+    'profile': SlashCommand([
+        Option(
+            'user', 'Whose profile to view (yours by default).',
+            OptionType.USER, convert=resolve_user,
+        ),
+    ]),
+    'gender': SlashCommand([
+        Option(
+            'gender', 'Your gender.', OptionType.STRING, required=True,
+            choices=GENDERS, param='new_gender',
+            convert=GenderConverter.convert,
+        ),
+    ]),
+    'list': SlashCommand([
+        Option('search', 'A name to search for.', OptionType.STRING),
+    ]),
+    'tree': SlashCommand(
+        [
+            Option(
+                'user', 'Only show people related to this user.',
+                OptionType.USER, convert=resolve_user,
+            ),
+            Option(
+                'depth', 'How many relationships away from the user to go.',
+                OptionType.INTEGER, flag=True,
+            ),
+            Option(
+                'limit', 'The most people to show.',
+                OptionType.INTEGER, flag=True,
+            ),
+        ],
+        flags_param='options',
+        flags=TreeOptions,
+    ),
+    'propose': SlashCommand([
+        Option(
+            'to', 'Who to propose to.', OptionType.USER, required=True,
+            convert=resolve_user,
+        ),
+    ]),
+    'adopt': SlashCommand([
+        Option(
+            'to', 'Who to adopt.', OptionType.USER, required=True,
+            convert=resolve_user,
+        ),
+    ]),
+    'accept': SlashCommand([
+        Option(
+            'other', 'Whose proposal to accept.', OptionType.USER,
+            required=True, convert=resolve_user,
+        ),
+    ]),
+    'leave': SlashCommand([
+        Option(
+            'other', 'Who to leave, or whose proposal to cancel or reject.',
+            OptionType.USER, required=True, convert=resolve_user,
+        ),
+    ]),
+    'proposals': SlashCommand(),
+    'about': SlashCommand(),
+}
+
+
+async def sync_commands(bot: 'CupidBot', guild_id: int):
+    """Register the application commands with Discord for a guild."""
+    payload = [
+        spec.payload(bot.get_command(name))
+        for name, spec in SLASH_COMMANDS.items()
+    ]
+    await bot.http.bulk_upsert_guild_commands(
+        bot.application_id, guild_id, payload,
+    )
+
+
+async def invoke(bot: 'CupidBot', interaction: discord.Interaction):
+    """Run the command for an application command interaction.
+
+    Errors and completion are dispatched as for prefix commands, so the
+    usual error handler and metrics apply.
+    """
+    name = interaction.data.get('name')
+    spec = SLASH_COMMANDS.get(name)
+    command = bot.get_command(name)
+    if not spec or not command:
+        return
+    await interaction.response.defer()
+    ctx = InteractionContext(bot, interaction, command)
+    values = {
+        option['name']: option['value']
+        for option in interaction.data.get('options', [])
+    }
+    bot.dispatch('command', ctx)
+    try:
+        if not await command.can_run(ctx):
+            raise commands.CheckFailure(
+                f'The check functions for command {name} failed.',
+            )
+        arguments = await spec.arguments(ctx, values)
+        await ctx.invoke(command, **arguments)
+    except commands.CommandError as error:
+        await command.dispatch_error(ctx, error)
+    except Exception as error:
+        await command.dispatch_error(
+            ctx, commands.CommandInvokeError(error),
+        )
+    else:
+        bot.dispatch('command_completion', ctx)
@@ -0,0 +1,93 @@
+"""Background worker for pushing Discord profile changes to the Cupid API."""
+import asyncio
+import logging
+from typing import Awaitable, Callable, Optional
+
+import discord
+
+
+logger = logging.getLogger(__name__)
+
+# How long to wait for pending updates to be pushed when shutting down.
+DRAIN_TIMEOUT = 10
+
+
+class ProfileSyncQueue:
+    """A write-behind queue of profile updates.
+
+    Multiple updates for the same user in the same guild are coalesced into
+    one, and updates are pushed in batches with a bound on how many are in
+    flight at once.
+    """
+
+    def __init__(
+            self,
+            sync: Callable[[int, discord.abc.User], Awaitable[None]],
+            concurrency: int,
+            batch_size: int):
+        """Set up the queue."""
+        self.sync = sync
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self._pending: dict[tuple[int, int], discord.abc.User] = {}
+        self._queue: asyncio.Queue[tuple[int, int]] = asyncio.Queue()
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        """Get the number of users waiting to be synced."""
+        return len(self._pending)
+
+    def push(self, guild_id: int, user: discord.abc.User):
+        """Queue a user to be synced, replacing any pending update for them."""
+        key = (guild_id, user.id)
+        if key not in self._pending:
+            self._queue.put_nowait(key)
+        self._pending[key] = user
+
+    def start(self):
+        """Start the background worker."""
+        if not self._task:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        """Push any pending updates, then stop the worker."""
+        if not self._task:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), DRAIN_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.warning(
+                'Gave up syncing %d profiles on shutdown.', len(self._pending),
+            )
+        self._task.cancel()
+        self._task = None
+
+    async def _run(self):
+        """Push updates in batches as they come in."""
+        while True:
+            batch = [await self._queue.get()]
+            while len(batch) < self.batch_size and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            await self._flush(batch)
+            for _key in batch:
+                self._queue.task_done()
+
+    async def _flush(self, keys: list[tuple[int, int]]):
+        """Push a batch of updates, with limited concurrency."""
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def sync_one(guild_id: int, user: discord.abc.User):
+            """Push one update, logging rather than raising errors."""
+            async with semaphore:
+                try:
+                    await self.sync(guild_id, user)
+                except Exception:
+                    logger.exception(
+                        'Failed to sync user %d in guild %d.',
+                        user.id, guild_id,
+                    )
+
+        await asyncio.gather(*(
+            sync_one(guild_id, self._pending.pop((guild_id, user_id)))
+            for guild_id, user_id in keys
+        ))
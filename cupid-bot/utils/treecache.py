@@ -0,0 +1,161 @@
+"""Cache of rendered family tree images."""
+import asyncio
+import collections
+import hashlib
+import io
+import pathlib
+from typing import (
+    Awaitable,
+    Callable,
+    Hashable,
+    Iterable,
+    Optional,
+    Union,
+)
+
+from cupid.annotations import Graph
+
+from .cache import LRUCache, SingleFlight
+from .family import FamilyGraph
+
+
+AnyGraph = Union[Graph, FamilyGraph]
+
+# Identifies a tree: the ID of its guild, then eg. the user it is centred on.
+Scope = tuple[Hashable, ...]
+
+# The maximum number of distinct trees (eg. one per user) to remember the
+# contents of.
+MAX_SCOPES = 1000
+
+
+def graph_key(data: AnyGraph) -> str:
+    """Get a stable hash of everything in a graph that affects its image."""
+    digest = hashlib.sha256()
+    for user in sorted(data.users.values(), key=lambda user: user.id):
+        digest.update(f'u{user.id}:{user.name}\0'.encode('utf-8'))
+    relationships = sorted(
+        (rel.initiator.id, rel.other.id, rel.kind.value)
+        for rel in data.relationships
+    )
+    for initiator, other, kind in relationships:
+        digest.update(f'r{initiator}:{other}:{kind}\0'.encode('utf-8'))
+    if isinstance(data, FamilyGraph):
+        for user_id, count in sorted(data.hidden.items()):
+            digest.update(f'h{user_id}:{count}\0'.encode('utf-8'))
+        digest.update(f'o{data.omitted}'.encode('utf-8'))
+    return digest.hexdigest()
+
+
+class TreeCache:
+    """A size-bounded cache of rendered trees, keyed by their content.
+
+    Images are kept in memory up to a total size, and optionally also
+    written to a directory on disk. The graph last fetched for each "scope"
+    (eg. a user's tree in a guild) is remembered for a while so that repeated
+    requests don't need to refetch it.
+    """
+
+    def __init__(
+            self,
+            max_bytes: int,
+            scope_ttl: float,
+            directory: Optional[pathlib.Path] = None):
+        """Set up the cache."""
+        self.max_bytes = max_bytes
+        self.directory = directory
+        if directory:
+            directory.mkdir(parents=True, exist_ok=True)
+        self.size = 0
+        self._images: collections.OrderedDict[str, bytes] = (
+            collections.OrderedDict()
+        )
+        self._scopes: LRUCache[Scope, tuple[str, frozenset[int]]] = (
+            LRUCache(MAX_SCOPES, scope_ttl)
+        )
+        self._renders: SingleFlight[str, bytes] = SingleFlight()
+
+    async def get(
+            self,
+            scope: Scope,
+            fetch: Callable[[], Awaitable[AnyGraph]],
+            render: Callable[[AnyGraph], Awaitable[io.BytesIO]]) -> bytes:
+        """Get a rendered tree, fetching and rendering it only if needed."""
+        entry = self._scopes.get(scope)
+        if entry:
+            key, _user_ids = entry
+            image = await self._load(key)
+            if image:
+                return image
+        data = await fetch()
+        key = graph_key(data)
+        self._scopes.set(scope, (key, frozenset(data.users)))
+        image = await self._load(key)
+        if image:
+            return image
+        return await self._renders.do(key, lambda: self._render(
+            key, data, render,
+        ))
+
+    def invalidate(self, guild_id: int, user_ids: Iterable[int]):
+        """Forget the contents of a guild's trees involving the given users."""
+        user_ids = set(user_ids)
+        for scope in self._scopes:
+            if scope[0] != guild_id:
+                continue
+            entry = self._scopes.peek(scope)
+            if entry and not user_ids.isdisjoint(entry[1]):
+                self._scopes.pop(scope)
+
+    async def _render(
+            self,
+            key: str,
+            data: AnyGraph,
+            render: Callable[[AnyGraph], Awaitable[io.BytesIO]]) -> bytes:
+        """Render a tree and store the image."""
+        image = (await render(data)).getvalue()
+        self._store(key, image)
+        if self.directory:
+            path = self.directory / f'{key}.png'
+            await asyncio.get_running_loop().run_in_executor(
+                None, path.write_bytes, image,
+            )
+        return image
+
+    async def _load(self, key: str) -> Optional[bytes]:
+        """Load an image from memory, or failing that, from disk."""
+        image = self._load_memory(key)
+        if not image and self.directory:
+            image = await self._load_disk(key)
+        return image
+
+    def _load_memory(self, key: str) -> Optional[bytes]:
+        """Load an image from memory, marking it as recently used."""
+        image = self._images.get(key)
+        if image:
+            self._images.move_to_end(key)
+        return image
+
+    async def _load_disk(self, key: str) -> Optional[bytes]:
+        """Load an image from disk, without blocking the event loop."""
+        path = self.directory / f'{key}.png'
+        try:
+            image = await asyncio.get_running_loop().run_in_executor(
+                None, path.read_bytes,
+            )
+        except FileNotFoundError:
+            return None
+        self._store(key, image)
+        return image
+
+    def _store(self, key: str, image: bytes):
+        """Store an image in memory, evicting old ones if needed."""
+        if len(image) > self.max_bytes:
+            return
+        if key in self._images:
+            self.size -= len(self._images.pop(key))
+        self._images[key] = image
+        self.size += len(image)
+        while self.size > self.max_bytes:
+            _key, old = self._images.popitem(last=False)
+            self.size -= len(old)
@@ -0,0 +1,46 @@
+"""Tools for filling the bot's local indexes when it starts up."""
+import asyncio
+from typing import Any, Protocol
+
+from discord.ext import commands
+
+from .resilience import ResilientCaller
+
+
+class StillWarmingUp(commands.CommandError):
+    """Raised when a command is used before the bot has finished starting."""
+
+    def __init__(self):
+        """Set the error message."""
+        super().__init__(
+            'The bot is still starting up, please try again in a few '
+            'seconds.',
+        )
+
+
+class Pages(Protocol):
+    """A paginated list from the API."""
+
+    total_pages: int
+
+    async def get_page(self, number: int) -> list[Any]:
+        """Get a page of items."""
+
+
+async def fetch_all_pages(
+        pages: Pages, api: ResilientCaller, concurrency: int) -> list[Any]:
+    """Fetch every page of a paginated list, a few pages at a time.
+
+    The first page is fetched on its own, since that is what loads the
+    number of pages.
+    """
+    first = await api.read(lambda: pages.get_page(0))
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def fetch(number: int) -> list[Any]:
+        """Fetch one page once there is a free slot."""
+        async with semaphore:
+            return await api.read(lambda: pages.get_page(number))
+
+    rest = await asyncio.gather(*map(fetch, range(1, pages.total_pages)))
+    return [item for page in (first, *rest) for item in page]
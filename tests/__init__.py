@@ -0,0 +1 @@
+"""Tests for the bot's local indexes and utilities."""
@@ -0,0 +1,24 @@
+"""Fixtures shared between tests."""
+import time
+
+import pytest
+
+
+class Clock:
+    """A stand-in for `time.monotonic` which only moves when told to."""
+
+    def __init__(self):
+        """Start the clock at an arbitrary time."""
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        """Get the current time."""
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch: pytest.MonkeyPatch) -> Clock:
+    """Replace `time.monotonic` with a clock which only moves when told to."""
+    fake = Clock()
+    monkeypatch.setattr(time, 'monotonic', fake)
+    return fake
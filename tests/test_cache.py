@@ -0,0 +1,85 @@
+"""Tests for the in-memory caches."""
+import asyncio
+import importlib
+
+from .conftest import Clock
+
+
+cache = importlib.import_module('cupid-bot.utils.cache')
+
+
+def test_entries_expire(clock: Clock):
+    """Entries are only returned until their TTL has passed."""
+    lru = cache.LRUCache(10, ttl=5)
+    lru.set('a', 1)
+    clock.now += 4.9
+    assert lru.get('a') == 1
+    assert 'a' in lru
+    clock.now += 0.1
+    assert lru.get('a') is None
+    assert 'a' not in lru
+    assert len(lru) == 0
+
+
+def test_set_restarts_ttl(clock: Clock):
+    """Storing an entry again gives it a new expiry time."""
+    lru = cache.LRUCache(10, ttl=5)
+    lru.set('a', 1)
+    clock.now += 4
+    lru.set('a', 2)
+    clock.now += 4
+    assert lru.get('a') == 2
+
+
+def test_entries_without_ttl_never_expire(clock: Clock):
+    """Without a TTL, entries are only removed by eviction."""
+    lru = cache.LRUCache(10)
+    lru.set('a', 1)
+    clock.now += 10 ** 9
+    assert lru.get('a') == 1
+
+
+def test_expired_entries_are_not_peeked_or_popped(clock: Clock):
+    """Expired entries are treated as missing everywhere."""
+    lru = cache.LRUCache(10, ttl=5)
+    lru.set('a', 1)
+    lru.set('b', 2)
+    clock.now += 5
+    assert lru.peek('a', 0) == 0
+    assert lru.pop('b', 0) == 0
+
+
+def test_least_recently_used_is_evicted():
+    """Getting an entry protects it from eviction, peeking doesn't."""
+    lru = cache.LRUCache(2)
+    lru.set('a', 1)
+    lru.set('b', 2)
+    assert lru.get('a') == 1
+    lru.set('c', 3)
+    assert list(lru) == ['a', 'c']
+    assert lru.peek('a') == 1
+    lru.set('d', 4)
+    assert list(lru) == ['c', 'd']
+
+
+def test_single_flight_shares_calls():
+    """Concurrent calls for a key share one result, later calls don't."""
+    flight = cache.SingleFlight()
+    calls = []
+
+    async def fetch() -> int:
+        """Pretend to make a slow request."""
+        calls.append(None)
+        await asyncio.sleep(0)
+        return len(calls)
+
+    async def main() -> list[int]:
+        """Make three concurrent calls, then one more."""
+        results = await asyncio.gather(
+            *(flight.do('a', fetch) for _ in range(3)),
+        )
+        return results + [await flight.do('a', fetch)]
+
+    assert asyncio.run(main()) == [1, 1, 1, 2]
+    assert flight.shared == 2
+    assert flight.hit_rate == 0.5
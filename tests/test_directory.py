@@ -0,0 +1,99 @@
+"""Tests for the local user directory."""
+import dataclasses
+import importlib
+
+from cupid import Gender
+
+
+directory = importlib.import_module('cupid-bot.utils.directory')
+
+
+@dataclasses.dataclass(frozen=True)
+class User:
+    """A stand-in for a Cupid user."""
+
+    id: int
+    name: str
+    gender: Gender = Gender.NON_BINARY
+
+
+def load(*names: str) -> 'directory.UserDirectory':
+    """Get a directory of users with the given names."""
+    users = directory.UserDirectory()
+    users.load(
+        User(user_id, name) for user_id, name in enumerate(names, start=1)
+    )
+    return users
+
+
+def first_page(search: 'directory.DirectorySearch') -> list[str]:
+    """Get the names in the first page of search results."""
+    return [entry.name for entry in search.page(0)]
+
+
+def test_prefix_matches_come_before_trigram_matches():
+    """Prefix matches are alphabetical, then fuzzy ones best match first."""
+    users = load('Marte', 'Tempest', 'artemisia', 'Bartemis', 'Artemis')
+    assert first_page(users.search('Artem')) == [
+        'Artemis', 'artemisia', 'Bartemis', 'Marte',
+    ]
+
+
+def test_short_queries_only_match_prefixes():
+    """Queries too short to have trigrams only match by prefix."""
+    users = load('Bia', 'Abigail', 'Bianca')
+    assert first_page(users.search(' bi')) == ['Bia', 'Bianca']
+
+
+def test_empty_query_lists_everyone():
+    """Every user is listed, alphabetically, if there is no query."""
+    users = load('Charis', 'Bia', 'Artemis')
+    assert first_page(users.search()) == ['Artemis', 'Bia', 'Charis']
+
+
+def test_add_reindexes_renamed_users():
+    """A user's old name stops matching once they are renamed."""
+    users = load('Demeter', 'Eris')
+    users.add(User(1, 'Flora', Gender.FEMALE))
+    users.add(User(3, 'Gaia'))
+    assert first_page(users.search('Dem')) == []
+    assert users.search('Flo').page(0) == [
+        directory.DirectoryEntry(id=1, name='Flora', gender=Gender.FEMALE),
+    ]
+    assert len(users) == 3
+    assert 3 in users
+
+
+def test_load_skips_duplicates():
+    """A user listed twice is only stored once."""
+    users = directory.UserDirectory()
+    users.load([User(1, 'Hera'), User(1, 'Hera')])
+    assert len(users) == 1
+    assert first_page(users.search('Hera')) == ['Hera']
+
+
+def test_pages():
+    """Results are split into pages."""
+    users = load(*(f'User {number:02}' for number in range(45)))
+    search = users.search('user')
+    assert search.total_pages == 3
+    assert len(search.page(1)) == directory.PAGE_SIZE
+    assert [entry.name for entry in search.page(2)] == [
+        'User 40', 'User 41', 'User 42', 'User 43', 'User 44',
+    ]
+
+
+def test_pages_span_prefix_and_trigram_matches():
+    """Trigram matches continue on the page where prefix matches end."""
+    users = load(
+        *(f'Robin {number:02}' for number in range(21)),
+        'Barrobin', 'Carrobin',
+    )
+    search = users.search('robin')
+    assert len(search) == 23
+    assert search.total_pages == 2
+    assert first_page(search)[-1] == 'Robin 19'
+    assert [entry.name for entry in search.page(1)] == [
+        'Robin 20', 'Barrobin', 'Carrobin',
+    ]
+    assert search.page(2) == []
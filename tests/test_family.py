@@ -0,0 +1,112 @@
+"""Tests for the local family graph index."""
+import importlib
+
+from benchmarks.synthetic import Graph, Relationship, User
+
+from cupid import RelationshipKind
+
+
+family = importlib.import_module('cupid-bot.utils.family')
+
+
+def chain(length: int) -> Graph:
+    """Get a graph of users each adopted by the one before."""
+    graph = Graph()
+    users = [graph.add_user() for _ in range(length)]
+    for parent, child in zip(users, users[1:]):
+        graph.adopt(parent, child)
+    return graph
+
+
+def test_load_replays_changes_made_while_reconciling():
+    """Changes made after a fetch started aren't lost when it is loaded."""
+    old = chain(3)
+    index = family.FamilyIndex.from_graph(old)
+    index.begin_reconcile()
+    # The graph is fetched here, before the changes below are made.
+    fetched = chain(3)
+    a, b, c = old.users[1], old.users[2], old.users[3]
+    index.remove(Relationship(a, b, RelationshipKind.ADOPTION))
+    d = User(id=4, name='User 4')
+    index.add(Relationship(c, d, RelationshipKind.MARRIAGE))
+    index.load(fetched)
+    assert set(index.relationships) == {(2, 3), (3, 4)}
+    assert index.users[4] == d
+    assert index.ready
+
+
+def test_load_stops_journaling():
+    """Changes after a load are applied directly, not replayed again."""
+    index = family.FamilyIndex()
+    index.begin_reconcile()
+    index.load(chain(2))
+    users = index.users
+    index.remove(Relationship(users[1], users[2], RelationshipKind.ADOPTION))
+    index.load(chain(2))
+    assert set(index.relationships) == {(1, 2)}
+
+
+def test_pending_relationships_are_not_followed():
+    """Unaccepted proposals don't connect people."""
+    graph = chain(2)
+    a, b = graph.users[1], graph.users[2]
+    index = family.FamilyIndex.from_graph(graph)
+    index.add(Relationship(a, b, RelationshipKind.ADOPTION, accepted=False))
+    component = index.component(a)
+    assert set(component.users) == {1}
+    assert component.relationships == []
+
+
+def test_component_depth():
+    """Only people within the depth are included, with the rest counted."""
+    graph = chain(5)
+    index = family.FamilyIndex.from_graph(graph)
+    component = index.component(graph.users[3], depth=1)
+    assert set(component.users) == {2, 3, 4}
+    assert len(component.relationships) == 2
+    assert component.hidden == {2: 1, 4: 1}
+
+
+def test_component_limit():
+    """The people nearest to the user are kept when there is a limit."""
+    graph = chain(5)
+    index = family.FamilyIndex.from_graph(graph)
+    component = index.component(graph.users[1], limit=3)
+    assert set(component.users) == {1, 2, 3}
+    assert component.hidden == {3: 1}
+
+
+def test_component_of_unknown_user():
+    """Someone with no relationships is in a component on their own."""
+    index = family.FamilyIndex.from_graph(chain(2))
+    user = User(id=10, name='User 10')
+    component = index.component(user, depth=2, limit=5)
+    assert component.users == {10: user}
+    assert component.relationships == []
+    assert component.hidden == {}
+
+
+def test_graph_limit_keeps_whole_families():
+    """With a limit, families are included whole where possible."""
+    graph = chain(3)
+    d, e = graph.add_user(), graph.add_user()
+    graph.marry(d, e)
+    index = family.FamilyIndex.from_graph(graph)
+    limited = index.graph(limit=4)
+    assert set(limited.users) == {1, 2, 3, 4}
+    assert limited.hidden == {4: 1}
+    assert limited.omitted == 1
+
+
+def test_end_reconcile_stops_journaling():
+    """A failed reconcile leaves the index up to date without a journal."""
+    graph = chain(2)
+    a, b = graph.users[1], graph.users[2]
+    index = family.FamilyIndex.from_graph(graph)
+    index.begin_reconcile()
+    index.add(Relationship(b, graph.add_user(), RelationshipKind.ADOPTION))
+    index.end_reconcile()
+    index.remove(Relationship(a, b, RelationshipKind.ADOPTION))
+    assert set(index.relationships) == {(2, 3)}
+    index.load(chain(2))
+    assert set(index.relationships) == {(1, 2)}
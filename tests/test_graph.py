@@ -0,0 +1,41 @@
+"""Tests for grouping users into ranks when drawing trees."""
+import importlib
+
+from benchmarks.synthetic import Graph
+
+
+graph_utils = importlib.import_module('cupid-bot.utils.graph')
+
+
+def test_disjoint_set_groups():
+    """Items joined directly or indirectly end up in one group."""
+    sets = graph_utils.DisjointSet()
+    sets.union(1, 2)
+    sets.union(3, 4)
+    sets.union(5, 5)
+    assert sorted(sets.groups()) == [[1, 2], [3, 4]]
+    sets.union(4, 1)
+    assert sets.groups() == [[1, 2, 3, 4]]
+    assert sets.find(2) == sets.find(3)
+
+
+def test_spouses_and_siblings_share_a_rank():
+    """Someone married into two sets of siblings gives one rank group."""
+    graph = Graph()
+    parent_a, parent_b = graph.add_user(), graph.add_user()
+    a, b, c, d = (graph.add_user() for _ in range(4))
+    graph.adopt(parent_a, a)
+    graph.adopt(parent_a, b)
+    graph.adopt(parent_b, c)
+    graph.adopt(parent_b, d)
+    graph.marry(b, c)
+    groups = graph_utils.rank_groups(graph.relationships)
+    assert groups == [[a.id, b.id, c.id, d.id]]
+
+
+def test_parents_and_children_are_not_grouped():
+    """An only child isn't put on the same rank as their parent."""
+    graph = Graph()
+    parent, child = graph.add_user(), graph.add_user()
+    graph.adopt(parent, child)
+    assert graph_utils.rank_groups(graph.relationships) == []
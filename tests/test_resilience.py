@@ -0,0 +1,98 @@
+"""Tests for the circuit breaker and retrying API calls."""
+import asyncio
+import importlib
+from typing import Awaitable, Callable
+
+from cupid import CupidError
+
+import pytest
+
+from .conftest import Clock
+
+
+resilience = importlib.import_module('cupid-bot.utils.resilience')
+
+
+class Rejected(CupidError):
+    """A stand-in for an error response from the API."""
+
+    def __init__(self):
+        """Set the message, without needing an API response."""
+        Exception.__init__(self, 'Rejected.')
+
+
+def failing(errors: list[BaseException]) -> Callable[[], Awaitable[str]]:
+    """Get a call which raises each error in turn, then succeeds."""
+    async def call() -> str:
+        """Raise the next error, if there is one."""
+        if errors:
+            raise errors.pop(0)
+        return 'ok'
+
+    return call
+
+
+def test_breaker_opens_after_threshold(clock: Clock):
+    """The breaker only opens once enough calls have failed in a row."""
+    breaker = resilience.CircuitBreaker(threshold=3, reset_after=10)
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.record_failure()
+    assert not breaker.is_open
+    breaker.record_failure()
+    assert breaker.is_open
+
+
+def test_breaker_half_opens_after_reset(clock: Clock):
+    """After the cool-down, one more failure opens the breaker again."""
+    breaker = resilience.CircuitBreaker(threshold=2, reset_after=10)
+    breaker.record_failure()
+    breaker.record_failure()
+    clock.now += 10
+    assert not breaker.is_open
+    breaker.record_failure()
+    assert breaker.is_open
+    clock.now += 10
+    breaker.record_success()
+    breaker.record_failure()
+    assert not breaker.is_open
+
+
+def test_reads_are_retried(clock: Clock):
+    """Transient failures are retried for reads but not writes."""
+    caller = resilience.ResilientCaller(
+        timeout=1, retries=2, backoff=0,
+        breaker=resilience.CircuitBreaker(threshold=5, reset_after=10),
+    )
+    read = failing([OSError(), asyncio.TimeoutError()])
+    assert asyncio.run(caller.read(read)) == 'ok'
+    write = failing([OSError()])
+    with pytest.raises(resilience.CupidUnavailable):
+        asyncio.run(caller.write(write))
+
+
+def test_rejections_are_not_failures(clock: Clock):
+    """Errors from the API itself don't count towards opening the breaker."""
+    breaker = resilience.CircuitBreaker(threshold=1, reset_after=10)
+    caller = resilience.ResilientCaller(
+        timeout=1, retries=2, backoff=0, breaker=breaker,
+    )
+    with pytest.raises(Rejected):
+        asyncio.run(caller.read(failing([Rejected()])))
+    assert not breaker.is_open
+
+
+def test_open_breaker_fails_fast(clock: Clock):
+    """No calls are made while the breaker is open."""
+    breaker = resilience.CircuitBreaker(threshold=1, reset_after=10)
+    caller = resilience.ResilientCaller(
+        timeout=1, retries=2, backoff=0, breaker=breaker,
+    )
+    errors = [OSError(), OSError()]
+    with pytest.raises(resilience.CupidUnavailable):
+        asyncio.run(caller.read(failing(errors)))
+    assert len(errors) == 1
+    clock.now += 10
+    assert asyncio.run(caller.read(failing([]))) == 'ok'